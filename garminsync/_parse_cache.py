@@ -0,0 +1,48 @@
+import os
+
+try:
+    import diskcache
+    HAS_DISKCACHE = True
+except ImportError:
+    HAS_DISKCACHE = False
+
+# Bump whenever parsing or metric calculation changes so stale entries are ignored
+PARSER_VERSION = 1
+CACHE_DIR = os.path.expanduser("~/.cache/garminsync/parse")
+
+_cache = None
+
+
+def _get_cache():
+    """Open the on-disk cache once per process"""
+    global _cache
+    if _cache is None:
+        _cache = diskcache.Cache(CACHE_DIR)
+    return _cache
+
+
+def cached_parse(file_path, parse):
+    """
+    Return parse(file_path), reusing a stored result while the file is unchanged
+
+    :param file_path: Activity file path
+    :param parse: Function returning a picklable metrics dict (or None)
+    :return: Parsed metrics
+    """
+    # Activities that were never downloaded have no file to key the cache on
+    if not HAS_DISKCACHE or not file_path:
+        return parse(file_path)
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return parse(file_path)
+
+    key = (file_path, st.st_mtime_ns, st.st_size, PARSER_VERSION)
+    cache = _get_cache()
+    metrics = cache.get(key)
+    if metrics is None:
+        metrics = parse(file_path)
+        # Failed parses are not cached so they are retried next time
+        if metrics is not None:
+            cache.set(key, metrics)
+    return metrics
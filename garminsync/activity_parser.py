@@ -1,52 +1,134 @@
 import os
-import gzip
-import fitdecode
-import xml.etree.ElementTree as ET
-import numpy as np
-from .fit_processor.power_estimator import PowerEstimator
-from .fit_processor.gear_analyzer import SinglespeedAnalyzer
-from math import radians, sin, cos, sqrt, atan2
+import io
+import asyncio
+import concurrent.futures
+import multiprocessing
+import zlib
+import hashlib
+import importlib.util
+from functools import lru_cache, partial
+try:
+    from isal import igzip as gzip_mod
+except ImportError:
+    import gzip as gzip_mod
+try:
+    import xxhash
+    _new_file_hash = xxhash.xxh64
+except ImportError:
+    _new_file_hash = partial(hashlib.blake2b, digest_size=8)
+try:
+    from lxml import etree as ET
+    HAS_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    HAS_LXML = False
+
+# numpy, fitdecode, numba and the analyzers are imported inside the functions
+# that need them so commands that never parse files start quickly
+HAS_NUMBA = importlib.util.find_spec('numba') is not None
+
+@lru_cache(maxsize=None)
+def _get_analyzers():
+    """Both analyzers only read their configuration, so one shared instance suffices"""
+    from .fit_processor.power_estimator import PowerEstimator
+    from .fit_processor.gear_analyzer import SinglespeedAnalyzer
+    return PowerEstimator(), SinglespeedAnalyzer()
+
+_CYCLING_SPORTS = frozenset({'cycling', 'road_biking', 'mountain_biking'})
+
+GZIP_MAGIC = b'\x1f\x8b'
+FIT_TYPES = ('fit', 'fit_gz')
+
+def _is_fit_header(header):
+    return len(header) >= 12 and (
+        header[4:8] == b'.FIT' or
+        header[0:4] == b'.FIT' or
+        header[4:8] == b'FIT.' or
+        header[8:12] == b'.FIT'
+    )
 
 def detect_file_type(file_path):
-    """Detect file format (FIT, XML, or unknown)"""
+    """Detect file format (FIT, gzipped FIT, XML, or unknown)"""
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return 'error'
+    return _detect_file_type(file_path, st.st_mtime_ns, st.st_size)
+
+@lru_cache(maxsize=4096)
+def _detect_file_type(file_path, mtime_ns, size):
+    """Sniff the file header; cached per (path, mtime, size) so rewrites are re-read"""
     try:
         with open(file_path, 'rb') as f:
             header = f.read(128)
-            if b'<?xml' in header[:20]:
-                return 'xml'
-            if len(header) >= 8 and header[4:8] == b'.FIT':
-                return 'fit'
-            if (len(header) >= 8 and 
-                (header[0:4] == b'.FIT' or 
-                 header[4:8] == b'FIT.' or 
-                 header[8:12] == b'.FIT')):
-                return 'fit'
-            return 'unknown'
+        if b'<?xml' in header[:20]:
+            return 'xml'
+        if header[:2] == GZIP_MAGIC:
+            # Inflate just the leading bytes to check the embedded FIT header
+            try:
+                inner = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(header, 16)
+            except zlib.error:
+                return 'unknown'
+            return 'fit_gz' if _is_fit_header(inner) else 'unknown'
+        if _is_fit_header(header):
+            return 'fit'
+        return 'unknown'
     except Exception as e:
         return 'error'
 
+TCX_NS = '{http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2}'
+_TCX_ACTIVITY = TCX_NS + 'Activity'
+_TCX_HR_BPM = TCX_NS + 'HeartRateBpm'
+_TCX_VALUE = TCX_NS + 'Value'
+_TCX_DISTANCE = TCX_NS + 'DistanceMeters'
+_TCX_TOTAL_TIME = TCX_NS + 'TotalTimeSeconds'
+_TCX_CALORIES = TCX_NS + 'Calories'
+_TCX_TRACKPOINT = TCX_NS + 'Trackpoint'
+
 def parse_xml_file(file_path):
     """Parse XML (TCX) file to extract activity metrics"""
     try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        namespaces = {'ns': 'http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2'}
+        sport = None
+        distance = duration = calories = max_hr = None
         
-        sport = root.find('.//ns:Activity', namespaces).get('Sport', 'other')
-        distance = root.find('.//ns:DistanceMeters', namespaces)
-        distance = float(distance.text) if distance is not None else None
-        duration = root.find('.//ns:TotalTimeSeconds', namespaces)
-        duration = float(duration.text) if duration is not None else None
-        calories = root.find('.//ns:Calories', namespaces)
-        calories = int(calories.text) if calories is not None else None
-        
-        hr_values = []
-        for hr in root.findall('.//ns:HeartRateBpm/ns:Value', namespaces):
-            try:
-                hr_values.append(int(hr.text))
-            except:
+        # Single streaming pass: take the first occurrence of each summary
+        # field and clear elements as we go so memory stays flat
+        for event, elem in ET.iterparse(file_path, events=('start', 'end')):
+            tag = elem.tag
+            if event == 'start':
+                if sport is None and tag == _TCX_ACTIVITY:
+                    sport = elem.get('Sport', 'other')
                 continue
-        max_hr = max(hr_values) if hr_values else None
+            
+            if tag == _TCX_HR_BPM:
+                # Running maximum; no per-sample list is kept
+                text = elem.findtext(_TCX_VALUE)
+                if text:
+                    try:
+                        hr = int(text)
+                    except ValueError:
+                        hr = None
+                    if hr is not None and (max_hr is None or hr > max_hr):
+                        max_hr = hr
+            elif tag == _TCX_DISTANCE:
+                if distance is None:
+                    distance = float(elem.text)
+            elif tag == _TCX_TOTAL_TIME:
+                if duration is None:
+                    duration = float(elem.text)
+            elif tag == _TCX_CALORIES:
+                if calories is None:
+                    calories = int(elem.text)
+            elif tag != _TCX_TRACKPOINT:
+                continue
+            elem.clear()
+            if HAS_LXML:
+                # Drop already-processed siblings so the partial tree doesn't grow
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+        
+        if sport is None:
+            return None
         
         return {
             "activityType": {"typeKey": sport},
@@ -61,134 +143,249 @@ def parse_xml_file(file_path):
     except Exception:
         return None
 
+EARTH_RADIUS_M = 6371000
+READ_BUFFER_SIZE = 128 * 1024
+# Unix time of the FIT epoch (1989-12-31T00:00:00Z)
+FIT_UTC_REFERENCE = 631065600
+# Below this many points the JIT call overhead outweighs the fused kernel
+NUMBA_MIN_POINTS = 500
+
 def compute_gradient(altitudes, positions, distance_m=10):
     """Compute gradient percentage for each point using elevation changes"""
-    if len(altitudes) < 2:
-        return [0] * len(altitudes)
-    
-    gradients = []
-    for i in range(1, len(altitudes)):
-        elev_change = altitudes[i] - altitudes[i-1]
-        if positions and i < len(positions):
-            distance = distance_between_points(positions[i-1], positions[i])
-        else:
-            distance = distance_m
-        gradients.append((elev_change / distance) * 100)
+    import numpy as np
+    
+    altitudes = np.asarray(altitudes, dtype=np.float64)
+    if altitudes.size < 2:
+        return np.zeros(altitudes.size)
+    
+    if HAS_NUMBA and altitudes.size > NUMBA_MIN_POINTS and len(positions) >= altitudes.size:
+        points = np.asarray(positions, dtype=np.float64)[:altitudes.size]
+        distances = np.empty(altitudes.size - 1)
+        gradients = np.empty(altitudes.size - 1)
+        _haversine_gradient_kernel()(
+            np.ascontiguousarray(points[:, 0]), np.ascontiguousarray(points[:, 1]),
+            altitudes, distances, gradients
+        )
+        return np.concatenate((gradients[:1], gradients))
     
-    return [gradients[0]] + gradients
+    # Fall back to a fixed spacing wherever no position pair is available
+    distances = np.full(altitudes.size - 1, float(distance_m))
+    if len(positions) >= 2:
+        points = np.asarray(positions, dtype=np.float64)
+        n = min(len(points), altitudes.size) - 1
+        distances[:n] = haversine_np(
+            points[:n, 0], points[:n, 1], points[1:n + 1, 0], points[1:n + 1, 1]
+        )
+    
+    # Stationary samples (zero distance) get a flat gradient
+    gradients = np.divide(
+        np.diff(altitudes) * 100, distances,
+        out=np.zeros_like(distances), where=distances > 0
+    )
+    return np.concatenate((gradients[:1], gradients))
 
-def distance_between_points(point1, point2):
-    """Calculate distance between two (lat, lon) points in meters using Haversine"""
-    R = 6371000  # Earth radius in meters
+def haversine_np(lat1, lon1, lat2, lon2):
+    """Vectorised Haversine distance in meters between (lat, lon) arrays"""
+    import numpy as np
     
-    lat1, lon1 = radians(point1[0]), radians(point1[1])
-    lat2, lon2 = radians(point2[0]), radians(point2[1])
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
     
     dlat = lat2 - lat1
     dlon = lon2 - lon1
     
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    
+    return EARTH_RADIUS_M * c
+
+@lru_cache(maxsize=None)
+def _haversine_gradient_kernel():
+    """Build the Numba kernel on first use so numba is only imported when needed"""
+    import math
+    from numba import njit, prange
+    
+    @njit(cache=True, fastmath=True, parallel=True)
+    def haversine_gradient(lat, lon, alt, out_dist, out_grad):
+        """Fused Haversine + gradient kernel writing into preallocated buffers"""
+        for i in prange(1, lat.size):
+            lat1 = math.radians(lat[i - 1])
+            lat2 = math.radians(lat[i])
+            dlat = lat2 - lat1
+            dlon = math.radians(lon[i] - lon[i - 1])
+            
+            a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+            d = EARTH_RADIUS_M * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+            
+            out_dist[i - 1] = d
+            out_grad[i - 1] = (alt[i] - alt[i - 1]) * 100 / d if d > 0 else 0.0
+    
+    return haversine_gradient
+
+class ChannelBuffer:
+    """Growable NumPy-backed buffer for a single sensor channel"""
+    
+    def __init__(self, dtype='float32', width=None, capacity=1024):
+        import numpy as np
+        
+        shape = (capacity,) if width is None else (capacity, width)
+        self._data = np.empty(shape, dtype=dtype)
+        self._size = 0
+    
+    def __len__(self):
+        return self._size
+    
+    def append(self, value):
+        if self._size == len(self._data):
+            # Double on overflow so appends stay amortised O(1)
+            import numpy as np
+            grown = np.empty((2 * len(self._data),) + self._data.shape[1:], dtype=self._data.dtype)
+            grown[:self._size] = self._data
+            self._data = grown
+        self._data[self._size] = value
+        self._size += 1
+    
+    def finish(self):
+        """Return the filled portion of the buffer as an array"""
+        return self._data[:self._size]
+
+def _ingest(fit, dm, metrics):
+    """Collect record samples into dm and session summary into metrics"""
+    import fitdecode
+    
+    # Bind hot-loop lookups to locals once
+    DATA = fitdecode.FIT_FRAME_DATA
+    ts_append = dm['timestamps'].append
+    pos_append = dm['positions'].append
+    alt_append = dm['altitudes'].append
+    speed_append = dm['speeds'].append
+    cad_append = dm['cadences'].append
+    power_append = dm['powers'].append
+    
+    for frame in fit:
+        if frame.frame_type != DATA:
+            continue
+        name = frame.name
+        if name == 'record':
+            get = frame.get_value
+            # Compare against None so legitimate zeros (coasting, sea level) are kept
+            timestamp = get('timestamp', fallback=None, raw_value=True)
+            if timestamp is not None:
+                ts_append(timestamp)
+            lat = get('position_lat', fallback=None)
+            lon = get('position_long', fallback=None)
+            if lat is not None and lon is not None:
+                pos_append((lat, lon))
+            altitude = get('altitude', fallback=None)
+            if altitude is not None:
+                alt_append(altitude)
+            speed = get('speed', fallback=None)
+            if speed is not None:
+                speed_append(speed)
+            cadence = get('cadence', fallback=None)
+            if cadence is not None:
+                cad_append(cadence)
+            power = get('power', fallback=None)
+            if power is not None:
+                power_append(power)
+        
+        elif name == 'session':
+            get = frame.get_value
+            metrics.update({
+                "sport": get("sport", fallback=None),
+                "total_timer_time": get("total_timer_time", fallback=None),
+                "total_distance": get("total_distance", fallback=None),
+                "max_heart_rate": get("max_heart_rate", fallback=None),
+                "avg_power": get("avg_power", fallback=None),
+                "total_calories": get("total_calories", fallback=None)
+            })
+
+@lru_cache(maxsize=None)
+def _fit_processor():
+    """fitdecode's data processors hold no per-file state, so one is shared"""
+    import fitdecode
+    
+    class RawTimestampProcessor(fitdecode.DefaultDataProcessor):
+        """Leave date_time fields as raw FIT seconds instead of building datetimes"""
+        
+        def process_type_date_time(self, reader, field_data):
+            pass
     
-    return R * c
+    return RawTimestampProcessor()
 
-def parse_fit_file(file_path):
+def _fit_reader(fileish):
+    """Open a FitReader with the options shared by every parse"""
+    import fitdecode
+    
+    # The default CRC check only warns on mismatch, so skipping it just saves
+    # the per-byte checksum work
+    return fitdecode.FitReader(
+        fileish,
+        processor=_fit_processor(),
+        check_crc=fitdecode.CrcCheck.DISABLED
+    )
+
+def parse_fit_file(file_path, file_type=None):
     """Parse FIT file to extract activity metrics and detailed cycling data"""
+    import numpy as np
+    
     metrics = {}
-    detailed_metrics = {
-        'speeds': [], 'cadences': [], 'altitudes': [],
-        'positions': [], 'gradients': [], 'powers': [], 'timestamps': []
+    channels = {
+        'speeds': ChannelBuffer(), 'cadences': ChannelBuffer(),
+        'altitudes': ChannelBuffer(), 'powers': ChannelBuffer(),
+        'positions': ChannelBuffer('float64', width=2),
+        'timestamps': ChannelBuffer('int64')
     }
     
-    power_estimator = PowerEstimator()
-    gear_analyzer = SinglespeedAnalyzer()
-    
     try:
-        with open(file_path, 'rb') as f:
-            magic = f.read(2)
-            f.seek(0)
-            is_gzipped = magic == b'\x1f\x8b'
+        if file_type is None:
+            file_type = detect_file_type(file_path)
         
-        if is_gzipped:
-            with gzip.open(file_path, 'rb') as gz_file:
-                from io import BytesIO
-                with BytesIO(gz_file.read()) as fit_data:
-                    fit = fitdecode.FitReader(fit_data)
-                    for frame in fit:
-                        if frame.frame_type == fitdecode.FrameType.DATA:
-                            if frame.name == 'record':
-                                if timestamp := frame.get_value('timestamp'):
-                                    detailed_metrics['timestamps'].append(timestamp)
-                                if (lat := frame.get_value('position_lat')) and (lon := frame.get_value('position_long')):
-                                    detailed_metrics['positions'].append((lat, lon))
-                                if altitude := frame.get_value('altitude'):
-                                    detailed_metrics['altitudes'].append(altitude)
-                                if speed := frame.get_value('speed'):
-                                    detailed_metrics['speeds'].append(speed)
-                                if cadence := frame.get_value('cadence'):
-                                    detailed_metrics['cadences'].append(cadence)
-                                if power := frame.get_value('power'):
-                                    detailed_metrics['powers'].append(power)
-                            
-                            elif frame.name == 'session':
-                                metrics = {
-                                    "sport": frame.get_value("sport"),
-                                    "total_timer_time": frame.get_value("total_timer_time"),
-                                    "total_distance": frame.get_value("total_distance"),
-                                    "max_heart_rate": frame.get_value("max_heart_rate"),
-                                    "avg_power": frame.get_value("avg_power"),
-                                    "total_calories": frame.get_value("total_calories")
-                                }
+        if file_type == 'fit_gz':
+            # Stream the decompressed bytes straight into fitdecode rather than
+            # materialising the whole file in memory first
+            with gzip_mod.open(file_path, 'rb') as gz_file:
+                with io.BufferedReader(gz_file, buffer_size=READ_BUFFER_SIZE) as fit_data:
+                    with _fit_reader(fit_data) as fit:
+                        _ingest(fit, channels, metrics)
         else:
-            with fitdecode.FitReader(file_path) as fit:
-                for frame in fit:
-                    if frame.frame_type == fitdecode.FrameType.DATA:
-                        if frame.name == 'record':
-                            if timestamp := frame.get_value('timestamp'):
-                                detailed_metrics['timestamps'].append(timestamp)
-                            if (lat := frame.get_value('position_lat')) and (lon := frame.get_value('position_long')):
-                                detailed_metrics['positions'].append((lat, lon))
-                            if altitude := frame.get_value('altitude'):
-                                detailed_metrics['altitudes'].append(altitude)
-                            if speed := frame.get_value('speed'):
-                                detailed_metrics['speeds'].append(speed)
-                            if cadence := frame.get_value('cadence'):
-                                detailed_metrics['cadences'].append(cadence)
-                            if power := frame.get_value('power'):
-                                detailed_metrics['powers'].append(power)
-                        
-                        elif frame.name == 'session':
-                            metrics = {
-                                "sport": frame.get_value("sport"),
-                                "total_timer_time": frame.get_value("total_timer_time"),
-                                "total_distance": frame.get_value("total_distance"),
-                                "max_heart_rate": frame.get_value("max_heart_rate"),
-                                "avg_power": frame.get_value("avg_power"),
-                                "total_calories": frame.get_value("total_calories")
-                            }
-    
-        # Compute gradients if data available
-        if detailed_metrics['altitudes']:
-            detailed_metrics['gradients'] = compute_gradient(
-                detailed_metrics['altitudes'],
-                detailed_metrics['positions']
-            )
+            with _fit_reader(file_path) as fit:
+                _ingest(fit, channels, metrics)
+    
+        detailed_metrics = {name: channel.finish() for name, channel in channels.items()}
+        # Raw FIT timestamps count from 1989-12-31; shift to Unix seconds in one step
+        detailed_metrics['timestamps'] = detailed_metrics['timestamps'] + FIT_UTC_REFERENCE
+        detailed_metrics['gradients'] = np.empty(0)
         
-        # Process cycling-specific metrics
-        if metrics.get('sport') in ['cycling', 'road_biking', 'mountain_biking']:
+        # Gradients only feed the cycling power/gear analysis, so other
+        # sports skip the Haversine pass entirely
+        if metrics.get('sport') in _CYCLING_SPORTS:
+            if detailed_metrics['altitudes'].size:
+                detailed_metrics['gradients'] = compute_gradient(
+                    detailed_metrics['altitudes'],
+                    detailed_metrics['positions']
+                )
+            
+            power_estimator, gear_analyzer = _get_analyzers()
             # Estimate power if not present
-            if not detailed_metrics['powers']:
-                for speed, gradient in zip(detailed_metrics['speeds'], detailed_metrics['gradients']):
-                    estimated_power = power_estimator.calculate_power(speed, gradient)
-                    detailed_metrics['powers'].append(estimated_power)
-                metrics['avg_power'] = np.mean(detailed_metrics['powers']) if detailed_metrics['powers'] else None
+            if not detailed_metrics['powers'].size:
+                # Speeds and gradients can differ in length when some records
+                # lack altitude; estimate over the overlapping prefix
+                n = min(detailed_metrics['speeds'].size, detailed_metrics['gradients'].size)
+                powers = power_estimator.calculate_power_batch(
+                    detailed_metrics['speeds'][:n], detailed_metrics['gradients'][:n]
+                )
+                detailed_metrics['powers'] = powers.astype(np.float32)
+                metrics['avg_power'] = float(powers.mean()) if powers.size else None
             
-            # Run gear analysis
-            if detailed_metrics['speeds'] and detailed_metrics['cadences']:
+            # Run gear analysis over the prefix every channel covers; records
+            # without cadence or altitude leave the channels different lengths
+            n = min(detailed_metrics['speeds'].size, detailed_metrics['cadences'].size,
+                    detailed_metrics['gradients'].size)
+            if n:
                 gear_analysis = gear_analyzer.analyze_gear_ratio(
-                    detailed_metrics['speeds'],
-                    detailed_metrics['cadences'],
-                    detailed_metrics['gradients']
+                    detailed_metrics['speeds'][:n],
+                    detailed_metrics['cadences'][:n],
+                    detailed_metrics['gradients'][:n]
                 )
                 metrics['gear_analysis'] = gear_analysis or {}
         
@@ -208,6 +405,90 @@ def parse_fit_file(file_path):
         print(f"Error parsing FIT file: {str(e)}")
         return None
 
+def parse_activity_file(file_path):
+    """Parse a local FIT or XML activity file, returning None if it can't be read"""
+    if not file_path or not os.path.exists(file_path):
+        return None
+    file_type = detect_file_type(file_path)
+    try:
+        if file_type in FIT_TYPES:
+            return parse_fit_file(file_path, file_type)
+        if file_type == 'xml':
+            return parse_xml_file(file_path)
+    except Exception as e:
+        print(f"Error parsing activity file: {str(e)}")
+    return None
+
+def _parse_summary(file_path):
+    metrics = parse_activity_file(file_path)
+    # Only the summary is returned, so nothing large crosses a process boundary
+    return metrics.get("summaryDTO") if metrics and "summaryDTO" in metrics else metrics
+
+def parse_activity_summary(file_path):
+    """Parse a local activity file and return only its summary metrics"""
+    from ._parse_cache import cached_parse
+    return cached_parse(file_path, _parse_summary)
+
+def file_hash(file_path):
+    """Fast content hash of a file, tagged with the parser version"""
+    from ._parse_cache import PARSER_VERSION
+    h = _new_file_hash()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(partial(f.read, READ_BUFFER_SIZE), b''):
+            h.update(chunk)
+    # A parser change invalidates every stored hash
+    return f"{PARSER_VERSION}:{h.hexdigest()}"
+
+def parse_activity_summary_if_changed(file_path, known_hash=None):
+    """
+    Parse a local activity file unless its content hash equals known_hash
+    
+    :param file_path: Path to the activity file
+    :param known_hash: Hash stored after the last successful parse, if any
+    :return: (file_hash, metrics); both are None when the file is unchanged,
+             unreadable or fails to parse, so only good parses record a hash
+    """
+    if not file_path:
+        return None, None
+    try:
+        digest = file_hash(file_path)
+    except OSError:
+        return None, None
+    if digest == known_hash:
+        return None, None
+    metrics = parse_activity_summary(file_path)
+    return (digest if metrics else None), metrics
+
+# Workers are started from a clean server process rather than forked from
+# callers that already run threads (the log listener, the scheduler, aiosqlite),
+# so they never inherit a lock held by one of those threads
+_POOL_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+def new_parse_pool(max_workers=None):
+    """Process pool for CPU-bound file parsing with fork-safe workers"""
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=_POOL_CONTEXT
+    )
+
+@lru_cache(maxsize=None)
+def get_parse_executor():
+    """Process pool for CPU-bound file parsing, shared by the daemon and the
+    web routes and created on first use"""
+    return new_parse_pool(max_workers=os.cpu_count() - 1 or 1)
+
+async def get_activity_metrics_async(activity, executor=None):
+    """
+    Parse the activity's local file in an executor so the event loop stays free
+    
+    :param activity: Activity object
+    :param executor: Executor to run the parse in (default: the loop's thread pool)
+    :return: Activity summary metrics dictionary, or None
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, parse_activity_summary, activity.filename)
+
 def get_activity_metrics(activity, client=None, force_reprocess=False):
     """
     Get activity metrics from local file or Garmin API
@@ -217,35 +498,15 @@ def get_activity_metrics(activity, client=None, force_reprocess=False):
     :param force_reprocess: If True, re-process file even if already parsed
     :return: Activity metrics dictionary
     """
-    metrics = None
-    # Always re-process if force_reprocess is True
-    if force_reprocess and activity.filename and os.path.exists(activity.filename):
-        file_type = detect_file_type(activity.filename)
+    # The local file is always parsed first, so force_reprocess needs no
+    # separate pass
+    metrics = parse_activity_file(activity.filename)
+    
+    if not metrics and client:
         try:
-            if file_type == 'fit':
-                metrics = parse_fit_file(activity.filename)
-            elif file_type == 'xml':
-                metrics = parse_xml_file(activity.filename)
+            metrics = client.get_activity_details(activity.activity_id)
         except Exception as e:
-            print(f"Error parsing activity file: {str(e)}")
-    
-    # Only parse if metrics not already obtained through force_reprocess
-    if not metrics:
-        if activity.filename and os.path.exists(activity.filename):
-            file_type = detect_file_type(activity.filename)
-            try:
-                if file_type == 'fit':
-                    metrics = parse_fit_file(activity.filename)
-                elif file_type == 'xml':
-                    metrics = parse_xml_file(activity.filename)
-            except Exception as e:
-                print(f"Error parsing activity file: {str(e)}")
-        
-        if not metrics and client:
-            try:
-                metrics = client.get_activity_details(activity.activity_id)
-            except Exception as e:
-                print(f"Error fetching activity from API: {str(e)}")
+            print(f"Error fetching activity from API: {str(e)}")
     
     # Return summary DTO for compatibility
     return metrics.get("summaryDTO") if metrics and "summaryDTO" in metrics else metrics
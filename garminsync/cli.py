@@ -1,17 +1,55 @@
 import os
 
+import click
 import typer
+from sqlalchemy import func, select
+from sqlalchemy.orm import load_only
+from tqdm import tqdm
 from typing_extensions import Annotated
 
 from .config import load_config
 
-# Initialize environment variables
+# Initialize environment variables before importing modules that read them
+# at import time (the database engine is built from DB_PATH)
 load_config()
 
+from .activity_parser import (new_parse_pool, parse_activity_summary,
+                              parse_activity_summary_if_changed)
+from .database import (COMMIT_BATCH_SIZE, Activity, flush_activity_updates,
+                       get_offline_stats, get_session, iter_missing_activities,
+                       reprocess_update, sync_database)
+from .garmin import GarminClient, download_activities
+from .utils import DATA_DIR, activity_filename, pid_file_path, terminate_process
+
 app = typer.Typer(
     help="GarminSync - Download Garmin Connect activities", rich_markup_mode=None
 )
 
+# Rows fetched per round trip when walking large activity tables
+STREAM_BATCH_SIZE = 500
+
+
+def _parse_one(filename):
+    """Parse a local activity file in a worker process and return its summary metrics"""
+    return parse_activity_summary(filename)
+
+
+def _iter_pages(session, query, key, size=None):
+    """Yield lists of rows from query, paging on the ascending unique column key.
+
+    Each page is a separate, fully consumed query, so callers can commit
+    between pages without invalidating an open cursor.
+    """
+    size = size or STREAM_BATCH_SIZE
+    last = None
+    while True:
+        page_query = query if last is None else query.where(key > last)
+        page = session.execute(page_query.order_by(key).limit(size)).all()
+        if not page:
+            return
+        yield page
+        last = getattr(page[-1], key.key)
+
 
 @app.command("list")
 def list_activities(
@@ -29,12 +67,6 @@ def list_activities(
     ] = False,
 ):
     """List activities based on specified filters"""
-    from tqdm import tqdm
-
-    from .database import (Activity, get_offline_stats, get_session,
-                           sync_database)
-    from .garmin import GarminClient
-
     # Validate input
     if not any([all_activities, missing, downloaded]):
         typer.echo(
@@ -57,25 +89,31 @@ def list_activities(
                 f"Working in offline mode - using cached data (last sync: {stats['last_sync']})"
             )
 
-        # Build query based on filters
-        query = session.query(Activity)
+        # Build query based on filters; only the displayed columns are loaded
+        query = select(Activity).options(
+            load_only(Activity.activity_id, Activity.start_time, Activity.downloaded)
+        )
 
         if all_activities:
             pass  # Return all activities
         elif missing:
-            query = query.filter_by(downloaded=False)
+            query = query.where(Activity.downloaded == False)
         elif downloaded:
-            query = query.filter_by(downloaded=True)
+            query = query.where(Activity.downloaded == True)
 
-        # Execute query and display results
-        activities = query.all()
-        if not activities:
+        count = session.scalar(
+            select(func.count()).select_from(query.order_by(None).subquery())
+        )
+        if not count:
             typer.echo("No activities found matching your criteria")
             return
 
+        # Stream rows in chunks rather than materialising the whole table
+        activities = session.scalars(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+
         # Display results with progress bar
-        typer.echo(f"Found {len(activities)} activities:")
-        for activity in tqdm(activities, desc="Listing activities"):
+        typer.echo(f"Found {count} activities:")
+        for activity in tqdm(activities, total=count, desc="Listing activities"):
             status = "Downloaded" if activity.downloaded else "Missing"
             typer.echo(
                 f"- ID: {activity.activity_id}, Start: {activity.start_time}, Status: {status}"
@@ -96,13 +134,6 @@ def download(
     ] = False,
 ):
     """Download activities based on specified filters"""
-    from pathlib import Path
-
-    from tqdm import tqdm
-
-    from .database import Activity, get_session
-    from .garmin import GarminClient
-
     # Validate input
     if not missing:
         typer.echo("Error: Currently only --missing downloads are supported")
@@ -114,46 +145,46 @@ def download(
 
         # Sync database with latest activities
         typer.echo("Syncing activities from Garmin Connect...")
-        from .database import sync_database
-
         sync_database(client)
 
-        # Get missing activities
-        activities = session.query(Activity).filter_by(downloaded=False).all()
-        if not activities:
+        # Count first so nothing is loaded when there is nothing to do
+        missing_count = session.scalar(
+            select(func.count()).select_from(Activity)
+            .where(Activity.downloaded == False)
+        )
+        if not missing_count:
             typer.echo("No missing activities found")
             return
 
         # Create data directory if it doesn't exist
-        data_dir = Path(os.getenv("DATA_DIR", "data"))
-        data_dir.mkdir(parents=True, exist_ok=True)
-
-        # Download activities with progress bar
-        typer.echo(f"Downloading {len(activities)} missing activities...")
-        for activity in tqdm(activities, desc="Downloading"):
-            try:
-                # Download FIT data
-                fit_data = client.download_activity_fit(activity.activity_id)
-
-                # Create filename-safe timestamp
-                timestamp = activity.start_time.replace(":", "-").replace(" ", "_")
-                filename = f"activity_{activity.activity_id}_{timestamp}.fit"
-                filepath = data_dir / filename
-
-                # Save file
-                with open(filepath, "wb") as f:
-                    f.write(fit_data)
-
-                # Update database
-                activity.filename = str(filepath)
-                activity.downloaded = True
-                session.commit()
-
-            except Exception as e:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+        pending = []
+
+        def record_download(activity_id, filepath, error):
+            if error:
                 typer.echo(
-                    f"Error downloading activity {activity.activity_id}: {str(e)}"
+                    f"Error downloading activity {activity_id}: {str(error)}"
                 )
-                session.rollback()
+                return
+            pending.append({
+                "activity_id": activity_id,
+                "filename": str(filepath),
+                "downloaded": True,
+            })
+            if len(pending) >= COMMIT_BATCH_SIZE:
+                flush_activity_updates(session, pending)
+
+        # Download activities concurrently with progress bar, one chunk of
+        # missing rows at a time so memory stays flat
+        typer.echo(f"Downloading {missing_count} missing activities...")
+        for activities in iter_missing_activities(session):
+            jobs = []
+            for activity in activities:
+                filename = activity_filename(activity.activity_id, activity.start_time)
+                jobs.append((activity.activity_id, activity.activity_id, DATA_DIR / filename))
+            download_activities(client, jobs, on_done=record_download, progress=True)
+            flush_activity_updates(session, pending)
 
         typer.echo("Download completed successfully")
 
@@ -182,16 +213,28 @@ def daemon_mode(
     ] = True,
 ):
     """Daemon mode operations"""
-    from .daemon import GarminSyncDaemon
+    from .daemon import get_daemon
 
     if start:
-        daemon = GarminSyncDaemon()
-        daemon.start(web_port=port, run_migrations=run_migrations)
+        get_daemon().start(web_port=port, run_migrations=run_migrations)
     elif stop:
-        # Implementation for stopping daemon (PID file or signal)
-        typer.echo("Stopping daemon...")
-        # TODO: Implement stop (we can use a PID file to stop the daemon)
-        typer.echo("Daemon stop not implemented yet")
+        pid_file = pid_file_path()
+        try:
+            pid = int(pid_file.read_text())
+        except (FileNotFoundError, ValueError) as e:
+            raise click.ClickException("Daemon is not running (no PID file)") from e
+
+        typer.echo(f"Stopping daemon (PID {pid})...")
+        try:
+            stopped = terminate_process(pid)
+        except OSError as e:
+            raise click.ClickException(f"Could not signal daemon (PID {pid}): {e}") from e
+        if not stopped:
+            typer.echo("Daemon did not stop in time")
+            raise typer.Exit(code=1)
+        # The daemon removes its own PID file; this clears a stale one
+        pid_file.unlink(missing_ok=True)
+        typer.echo("Daemon stopped")
     elif status:
         # Show current daemon status
         typer.echo("Daemon status not implemented yet")
@@ -219,9 +262,6 @@ def analyze_activities(
     cycling: Annotated[bool, typer.Option("--cycling", help="Run cycling-specific analysis")] = False,
 ):
     """Analyze activity data for cycling metrics"""
-    from tqdm import tqdm
-    from .database import Activity, get_session
-    from .activity_parser import get_activity_metrics
     
     if not cycling:
         typer.echo("Error: Currently only cycling analysis is supported")
@@ -231,7 +271,7 @@ def analyze_activities(
     activities = []
 
     if activity_id:
-        activity = session.query(Activity).get(activity_id)
+        activity = session.get(Activity, activity_id)
         if not activity:
             typer.echo(f"Error: Activity with ID {activity_id} not found")
             raise typer.Exit(code=1)
@@ -249,15 +289,25 @@ def analyze_activities(
         raise typer.Exit(code=1)
 
     typer.echo(f"Analyzing {len(activities)} cycling activities...")
-    for activity in tqdm(activities, desc="Processing"):
-        metrics = get_activity_metrics(activity)
-        if metrics and "gearAnalysis" in metrics:
-            # Update activity with analysis results
-            activity.analyzed = True
-            activity.gear_ratio = metrics["gearAnalysis"].get("gear_ratio")
-            activity.gear_inches = metrics["gearAnalysis"].get("gear_inches")
-            # Add other metrics as needed
+    filenames = [activity.filename for activity in activities]
+    with new_parse_pool(max_workers=os.cpu_count()) as executor:
+        results = executor.map(_parse_one, filenames, chunksize=8)
+        try:
+            for i, (activity, metrics) in enumerate(
+                tqdm(zip(activities, results), total=len(activities), desc="Processing")
+            ):
+                if metrics and "gearAnalysis" in metrics:
+                    # Update activity with analysis results
+                    activity.analyzed = True
+                    activity.gear_ratio = metrics["gearAnalysis"].get("gear_ratio")
+                    activity.gear_inches = metrics["gearAnalysis"].get("gear_inches")
+                    # Add other metrics as needed
+                if (i + 1) % COMMIT_BATCH_SIZE == 0:
+                    session.commit()
             session.commit()
+        except Exception:
+            session.rollback()
+            raise
 
     typer.echo("Analysis completed successfully")
 
@@ -268,55 +318,54 @@ def reprocess_activities(
     activity_id: Annotated[int, typer.Option("--activity-id", help="Reprocess specific activity by ID")] = None,
 ):
     """Reprocess activities to calculate missing metrics"""
-    from tqdm import tqdm
-    from .database import Activity, get_session
-    from .activity_parser import get_activity_metrics
 
     session = get_session()
-    activities = []
     
     if activity_id:
-        activity = session.query(Activity).get(activity_id)
-        if not activity:
-            typer.echo(f"Error: Activity with ID {activity_id} not found")
-            raise typer.Exit(code=1)
-        activities = [activity]
+        condition = Activity.activity_id == activity_id
+        empty_message = f"Error: Activity with ID {activity_id} not found"
     elif missing:
-        activities = session.query(Activity).filter(
-            Activity.reprocessed == False
-        ).all()
-        if not activities:
-            typer.echo("No activities to reprocess")
-            return
+        condition = Activity.reprocessed == False
+        empty_message = "No activities to reprocess"
     elif all:
-        activities = session.query(Activity).filter(
-            Activity.downloaded == True
-        ).all()
-        if not activities:
-            typer.echo("No downloaded activities found")
-            return
+        condition = Activity.downloaded == True
+        empty_message = "No downloaded activities found"
     else:
         typer.echo("Error: Please specify one of: --all, --missing, --activity-id")
         raise typer.Exit(code=1)
 
-    typer.echo(f"Reprocessing {len(activities)} activities...")
-    for activity in tqdm(activities, desc="Reprocessing"):
-        # Use force_reprocess=True to ensure we parse the file again
-        metrics = get_activity_metrics(activity, force_reprocess=True)
-        
-        # Update activity metrics
-        if metrics:
-            activity.activity_type = metrics.get("activityType", {}).get("typeKey")
-            activity.duration = int(float(metrics.get("duration", 0))) if metrics.get("duration") else activity.duration
-            activity.distance = float(metrics.get("distance", 0)) if metrics.get("distance") else activity.distance
-            activity.max_heart_rate = int(float(metrics.get("maxHR", 0))) if metrics.get("maxHR") else activity.max_heart_rate
-            activity.avg_heart_rate = int(float(metrics.get("avgHR", 0))) if metrics.get("avgHR") else activity.avg_heart_rate
-            activity.avg_power = float(metrics.get("avgPower", 0)) if metrics.get("avgPower") else activity.avg_power
-            activity.calories = int(float(metrics.get("calories", 0))) if metrics.get("calories") else activity.calories
-        
-        # Mark as reprocessed
-        activity.reprocessed = True
-        session.commit()
+    total = session.scalar(select(func.count()).select_from(Activity).where(condition))
+    if not total:
+        typer.echo(empty_message)
+        if activity_id:
+            raise typer.Exit(code=1)
+        return
+
+    typer.echo(f"Reprocessing {total} activities...")
+    # Only (id, filename, file_hash) rows are read, one page at a time, and
+    # updates go back as plain row dicts so no ORM objects accumulate
+    query = select(
+        Activity.activity_id, Activity.filename, Activity.file_hash
+    ).where(condition)
+    # Files are parsed in worker processes; DB updates stay on the main process
+    with new_parse_pool(max_workers=os.cpu_count()) as executor, \
+            tqdm(total=total, desc="Reprocessing") as progress:
+        for batch in _iter_pages(session, query, Activity.activity_id):
+            # Unchanged files are skipped, except when one activity is
+            # requested explicitly
+            known_hashes = [None if activity_id else row.file_hash for row in batch]
+            results = executor.map(
+                parse_activity_summary_if_changed,
+                [row.filename for row in batch],
+                known_hashes,
+                chunksize=8,
+            )
+            pending = [
+                reprocess_update(row.activity_id, metrics, digest)
+                for row, (digest, metrics) in zip(batch, results)
+            ]
+            flush_activity_updates(session, pending)
+            progress.update(len(batch))
     
     typer.echo("Reprocessing completed")
 
@@ -326,8 +375,6 @@ def generate_report(
     gear_analysis: Annotated[bool, typer.Option("--gear-analysis", help="Generate gear analysis report")] = False,
 ):
     """Generate performance reports for cycling activities"""
-    from .database import Activity, get_session
-    from .web import app as web_app
     
     if not any([power_analysis, gear_analysis]):
         typer.echo("Error: Please specify at least one report type")
@@ -1,40 +1,80 @@
+import importlib.util
 import os
 import signal
-import asyncio
 import concurrent.futures
-import time
 from datetime import datetime
+import queue
 from queue import PriorityQueue
 import threading
 
+from tqdm import tqdm
+from apscheduler.executors.pool import ThreadPoolExecutor as APSThreadPoolExecutor
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import func, select, update
 
-from .database import Activity, DaemonConfig, SyncLog, get_legacy_session, init_db, get_offline_stats
-from .garmin import GarminClient
-from .utils import logger
-from .activity_parser import get_activity_metrics
+from .database import (COMMIT_BATCH_SIZE, Activity, DaemonConfig, SyncLog,
+                       flush_activity_updates, init_db, iter_missing_activities,
+                       metric_columns, reprocess_update, session_scope,
+                       sync_database, sync_engine)
+from .garmin import GarminClient, download_activities
+from .utils import DATA_DIR, activity_filename, logger, pid_file_path
+from .activity_parser import get_parse_executor, parse_activity_summary_if_changed
+
+# When uvloop is installed, uvicorn sets it as the event loop policy as it
+# starts the web UI; the daemon runs no other event loops
+HAS_UVLOOP = importlib.util.find_spec("uvloop") is not None
 
 # Priority levels: 1=High (API requests), 2=Medium (Sync jobs), 3=Low (Reprocessing)
 PRIORITY_HIGH = 1
 PRIORITY_MEDIUM = 2
 PRIORITY_LOW = 3
 
+# Fallback sync schedule, parsed once
+DEFAULT_SYNC_CRON = "0 */6 * * *"
+_DEFAULT_SYNC_TRIGGER = CronTrigger.from_crontab(DEFAULT_SYNC_CRON)
+
+# SyncLog rows are buffered and written together once this many are queued
+# or LOG_FLUSH_INTERVAL seconds after the first one, whichever comes first
+LOG_FLUSH_SIZE = 100
+LOG_FLUSH_INTERVAL = 2.0
+
 class GarminSyncDaemon:
     def __init__(self):
-        self.scheduler = BackgroundScheduler()
+        # Jobs persist in the activity database; after downtime, missed runs
+        # collapse into one and never overlap
+        self.scheduler = BackgroundScheduler(
+            jobstores={"default": SQLAlchemyJobStore(engine=sync_engine)},
+            # Jobs only put a task on the queue, so one scheduler thread is
+            # enough; the work itself runs on self.executor
+            executors={"default": APSThreadPoolExecutor(max_workers=1)},
+            job_defaults={"coalesce": True, "misfire_grace_time": 300, "max_instances": 1},
+        )
         self.running = False
+        # Set by the signal handler or stop(); the main thread blocks on it
+        self._stop_event = threading.Event()
+        # stop() runs its cleanup once, however many shutdown paths call it
+        self._stop_lock = threading.Lock()
+        self._stopped = False
         self.web_server = None
-        # Process pool for CPU-bound tasks
-        self.executor = concurrent.futures.ProcessPoolExecutor(
-            max_workers=os.cpu_count() - 1 or 1
-        )
+        # Sync/reprocess jobs are dominated by HTTP and SQLite I/O, so threads
+        # suffice and can share the pooled engine
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        # Process pool for CPU-bound activity file parsing, shared with the web routes
+        self.parse_executor = get_parse_executor()
         # Priority queue for task scheduling
         self.task_queue = PriorityQueue()
         # Worker thread for processing tasks
         self.worker_thread = threading.Thread(target=self._process_tasks, daemon=True)
         # Lock for database access during migration
         self.db_lock = threading.Lock()
+        # Pending SyncLog rows (plain dicts) and the timer that flushes them
+        self._log_buf = []
+        self._log_lock = threading.Lock()
+        self._log_timer = None
+        # Authenticated Garmin client reused across scheduled runs
+        self._client = None
 
     def start(self, web_port=8888, run_migrations=True):
         """Start daemon with scheduler and web UI"""
@@ -60,16 +100,20 @@ class GarminSyncDaemon:
                 # Sync job
                 cron_str = config_data["schedule_cron"]
                 try:
-                    # Validate cron string
-                    if not cron_str or len(cron_str.strip().split()) != 5:
+                    # Parse once; rows written since DaemonConfig validates
+                    # schedule_cron are always valid, older ones may not be
+                    try:
+                        trigger = CronTrigger.from_crontab(cron_str)
+                    except (ValueError, TypeError, AttributeError):
                         logger.error(
-                            f"Invalid cron schedule: '{cron_str}'. Using default '0 */6 * * *'"
+                            f"Invalid cron schedule: '{cron_str}'. Using default '{DEFAULT_SYNC_CRON}'"
                         )
-                        cron_str = "0 */6 * * *"
+                        cron_str = DEFAULT_SYNC_CRON
+                        trigger = _DEFAULT_SYNC_TRIGGER
 
                     self.scheduler.add_job(
-                        func=self._enqueue_sync,
-                        trigger=CronTrigger.from_crontab(cron_str),
+                        func=enqueue_sync,
+                        trigger=trigger,
                         id="sync_job",
                         replace_existing=True,
                     )
@@ -78,18 +122,18 @@ class GarminSyncDaemon:
                     logger.error(f"Failed to create sync job: {str(e)}")
                     # Fallback to default schedule
                     self.scheduler.add_job(
-                        func=self._enqueue_sync,
-                        trigger=CronTrigger.from_crontab("0 */6 * * *"),
+                        func=enqueue_sync,
+                        trigger=_DEFAULT_SYNC_TRIGGER,
                         id="sync_job",
                         replace_existing=True,
                     )
-                    logger.info("Using default schedule for sync job: '0 */6 * * *'")
+                    logger.info(f"Using default schedule for sync job: '{DEFAULT_SYNC_CRON}'")
                 
                 # Reprocess job - run daily at 2 AM
                 reprocess_cron = "0 2 * * *"
                 try:
                     self.scheduler.add_job(
-                        func=self._enqueue_reprocess,
+                        func=enqueue_reprocess,
                         trigger=CronTrigger.from_crontab(reprocess_cron),
                         id="reprocess_job",
                         replace_existing=True,
@@ -112,13 +156,18 @@ class GarminSyncDaemon:
             signal.signal(signal.SIGINT, self.signal_handler)
             signal.signal(signal.SIGTERM, self.signal_handler)
 
+            # Record our PID so `daemon --stop` can signal this process
+            pid_file = pid_file_path()
+            pid_file.parent.mkdir(parents=True, exist_ok=True)
+            pid_file.write_text(str(os.getpid()))
+
             logger.info(
                 f"Daemon started. Web UI available at http://localhost:{web_port}"
             )
 
-            # Keep daemon running
-            while self.running:
-                time.sleep(1)
+            # Block until a shutdown signal arrives instead of polling a flag
+            self._stop_event.wait()
+            self.stop()
 
         except Exception as e:
             logger.error(f"Failed to start daemon: {str(e)}")
@@ -141,131 +190,157 @@ class GarminSyncDaemon:
         while self.running:
             try:
                 priority, (task_type, data) = self.task_queue.get(timeout=1)
+            except queue.Empty:
+                # Timeout is normal when queue is empty
+                continue
+
+            try:
                 logger.info(f"Processing {task_type} task (priority {priority})")
                 
                 if task_type == "sync":
-                    self._execute_in_process_pool(self.sync_and_download)
+                    self._execute_in_pool(self.sync_and_download)
                 elif task_type == "reprocess":
-                    self._execute_in_process_pool(self.reprocess_activities)
+                    self._execute_in_pool(self.reprocess_activities)
                 elif task_type == "api":
                     # Placeholder for high-priority API tasks
                     logger.debug(f"Processing API task: {data}")
-                
-                self.task_queue.task_done()
             except Exception as e:
                 logger.error(f"Task processing error: {str(e)}")
-            except asyncio.TimeoutError:
-                # Timeout is normal when queue is empty
-                pass
+            finally:
+                self.task_queue.task_done()
         logger.info("Task worker stopped")
 
-    def _execute_in_process_pool(self, func):
-        """Execute function in process pool and handle results"""
+    def _execute_in_pool(self, func):
+        """Execute function in the job thread pool and handle results"""
         try:
             future = self.executor.submit(func)
             # Block until done to maintain task order but won't block main thread
             result = future.result()  
-            logger.debug(f"Process pool task completed: {result}")
+            logger.debug(f"Pool task completed: {result}")
         except Exception as e:
-            logger.error(f"Process pool task failed: {str(e)}")
+            logger.error(f"Pool task failed: {str(e)}")
 
     def sync_and_download(self):
-        """Scheduled job function (run in process pool)"""
-        session = None
+        """Scheduled job function (run in the job thread pool)"""
         try:
             self.log_operation("sync", "started")
 
-            # Import here to avoid circular imports
-            from .database import sync_database
-            from .garmin import GarminClient
-
-            # Perform sync and download
-            client = GarminClient()
+            # Perform sync and download; the client (and its login and HTTP
+            # connection pool) is kept between runs
+            if self._client is None:
+                self._client = GarminClient()
+            client = self._client
 
             # Sync database first
             with self.db_lock:
                 sync_database(client)
 
-            # Download missing activities
+            # Download missing activities a chunk at a time, committing each
+            # chunk before the next is read
+            DATA_DIR.mkdir(parents=True, exist_ok=True)
             downloaded_count = 0
-            session = get_legacy_session()
-            missing_activities = (
-                session.query(Activity).filter_by(downloaded=False).all()
-            )
-
-            for activity in missing_activities:
-                try:
-                    # Download FIT file
-                    fit_data = client.download_activity_fit(activity.activity_id)
-                    
-                    # Save to file
-                    import os
-                    from pathlib import Path
-                    data_dir = Path(os.getenv("DATA_DIR", "data"))
-                    data_dir.mkdir(parents=True, exist_ok=True)
-                    timestamp = activity.start_time.replace(":", "-").replace(" ", "_")
-                    filename = f"activity_{activity.activity_id}_{timestamp}.fit"
-                    filepath = data_dir / filename
-                    
-                    with open(filepath, "wb") as f:
-                        f.write(fit_data)
-                    
-                    # Update activity record
-                    activity.filename = str(filepath)
-                    activity.downloaded = True
-                    activity.last_sync = datetime.now().isoformat()
-                    
-                    # Get metrics immediately after download
-                    metrics = get_activity_metrics(activity, client)
-                    if metrics:
-                        # Update metrics if available
-                        activity.activity_type = metrics.get("activityType", {}).get("typeKey")
-                        activity.duration = int(float(metrics.get("duration", 0)))
-                        activity.distance = float(metrics.get("distance", 0))
-                        activity.max_heart_rate = int(float(metrics.get("maxHR", 0)))
-                        activity.avg_power = float(metrics.get("avgPower", 0))
-                        activity.calories = int(float(metrics.get("calories", 0)))
-                    
-                    session.commit()
-                    downloaded_count += 1
-                    session.commit()
-
-                except Exception as e:
-                    logger.error(
-                        f"Failed to download activity {activity.activity_id}: {e}"
+            with session_scope() as session:
+                for missing_activities in iter_missing_activities(session):
+                    downloaded_count += self._download_chunk(
+                        client, session, missing_activities
                     )
-                    session.rollback()
 
-            self.log_operation(
-                "sync", "success", 
+            # Log success and update last run time in one transaction
+            self._complete_run(
+                "sync",
                 f"Downloaded {downloaded_count} new activities and updated metrics"
             )
 
-            # Update last run time
-            self.update_daemon_last_run()
-
         except Exception as e:
             logger.error(f"Sync failed: {e}")
             self.log_operation("sync", "error", str(e))
-        finally:
-            if session:
-                session.close()
+            # Expired or revoked credentials surface here; log in afresh next run
+            self._client = None
+
+    def _download_chunk(self, client, session, missing_activities):
+        """Download, parse and record one chunk of missing activities
+
+        Returns the number of files downloaded.
+        """
+        jobs = []
+        for activity in missing_activities:
+            filename = activity_filename(activity.activity_id, activity.start_time)
+            jobs.append((activity.activity_id, activity.activity_id, DATA_DIR / filename))
+
+        downloaded = []
+
+        def record_download(activity_id, filepath, error):
+            if error:
+                logger.error(
+                    f"Failed to download activity {activity_id}: {error}"
+                )
+                return
+            downloaded.append((activity_id, str(filepath)))
+
+        # Files are fetched concurrently (CONCURRENT_DOWNLOADS at a time)
+        download_activities(client, jobs, on_done=record_download)
+
+        # Parse the new files in the process pool rather than one by one on
+        # this thread; the content hash is kept so the next reprocess run can
+        # skip them
+        results = self.parse_executor.map(
+            parse_activity_summary_if_changed,
+            [filename for _, filename in downloaded],
+            chunksize=8,
+        )
+        pending = []
+
+        def flush_pending():
+            # One last_sync timestamp per committed batch
+            now_iso = datetime.now().isoformat()
+            for row in pending:
+                row["last_sync"] = now_iso
+            flush_activity_updates(session, pending)
+
+        for (activity_id, filename), (digest, metrics) in zip(downloaded, results):
+            # Update activity record
+            row = {
+                "activity_id": activity_id,
+                "filename": filename,
+                "downloaded": True,
+            }
+            if not metrics:
+                # Fall back to the Garmin API, as get_activity_metrics does; an
+                # API error must not lose the downloads already on disk
+                try:
+                    metrics = client.get_activity_details(activity_id)
+                except Exception as e:
+                    logger.error(
+                        f"Failed to fetch metrics for activity {activity_id}: {e}"
+                    )
+                    metrics = {}
+            elif digest:
+                row["file_hash"] = digest
+            # Update metrics if available
+            row.update(metric_columns(metrics))
+            pending.append(row)
+            if len(pending) >= COMMIT_BATCH_SIZE:
+                flush_pending()
+
+        flush_pending()
+        return len(downloaded)
 
     def load_config(self):
-        """Load daemon configuration from database and return dict"""
-        session = get_session()
-        try:
+        """Load daemon configuration from database and return dict
+
+        Read afresh each time: the web API also writes DaemonConfig.
+        """
+        with session_scope() as session:
             config = session.query(DaemonConfig).first()
             if not config:
                 # Create default configuration with explicit cron schedule
                 config = DaemonConfig(
-                    schedule_cron="0 */6 * * *", enabled=True, status="stopped"
+                    schedule_cron=DEFAULT_SYNC_CRON, enabled=True, status="stopped"
                 )
                 session.add(config)
                 session.commit()
-                session.refresh(config)  # Ensure we have the latest data
 
-            # Return configuration as dictionary to avoid session issues
+            # Return configuration as a dictionary to avoid session issues
             return {
                 "id": config.id,
                 "enabled": config.enabled,
@@ -274,33 +349,38 @@ class GarminSyncDaemon:
                 "next_run": config.next_run,
                 "status": config.status,
             }
-        finally:
-            session.close()
+
+    def _update_config(self, conn=None, **values):
+        """Write config columns with a single UPDATE
+
+        DaemonConfig holds a single row, created by load_config() at startup,
+        so no WHERE clause is needed. Pass conn to join an open transaction
+        instead of starting one.
+        """
+        statement = update(DaemonConfig).values(**values)
+        if conn is not None:
+            conn.execute(statement)
+        else:
+            with sync_engine.begin() as conn:
+                conn.execute(statement)
 
     def update_daemon_status(self, status):
         """Update daemon status in database"""
-        session = get_session()
-        try:
-            config = session.query(DaemonConfig).first()
-            if not config:
-                config = DaemonConfig()
-                session.add(config)
-
-            config.status = status
-            session.commit()
-        finally:
-            session.close()
+        self._update_config(status=status)
 
     def update_daemon_last_run(self):
         """Update daemon last run timestamp"""
-        session = get_session()
+        self._update_config(last_run=datetime.now().isoformat())
+
+    def _complete_run(self, operation, message):
+        """Log a successful job and stamp last_run in a single transaction"""
+        self.log_operation(operation, "success", message)
         try:
-            config = session.query(DaemonConfig).first()
-            if config:
-                config.last_run = datetime.now().isoformat()
-                session.commit()
-        finally:
-            session.close()
+            with sync_engine.begin() as conn:
+                self._update_config(conn, last_run=datetime.now().isoformat())
+                self._flush_logs(conn)
+        except Exception as e:
+            logger.error(f"Failed to record {operation} run: {e}")
 
     def start_web_ui(self, port):
         """Start FastAPI web server in a separate thread"""
@@ -313,6 +393,8 @@ class GarminSyncDaemon:
             def shutdown_event():
                 logger.info("Web server shutting down")
                 self.running = False
+                # Release the main thread, which no longer polls self.running
+                self._stop_event.set()
                 self.worker_thread.join(timeout=5)
 
             def run_server():
@@ -324,7 +406,7 @@ class GarminSyncDaemon:
                         port=port, 
                         log_level="info",
                         workers=1,
-                        loop="asyncio"
+                        loop="uvloop" if HAS_UVLOOP else "asyncio"
                     )
                     server = uvicorn.Server(config)
                     server.run()
@@ -340,98 +422,141 @@ class GarminSyncDaemon:
     def signal_handler(self, signum, frame):
         """Handle shutdown signals"""
         logger.info("Received shutdown signal, stopping daemon...")
-        self.stop()
+        self._stop_event.set()
 
     def stop(self):
-        """Stop daemon and clean up resources"""
+        """Stop daemon and clean up resources; later calls do nothing"""
+        with self._stop_lock:
+            if self._stopped:
+                return
+            self._stopped = True
         if self.scheduler.running:
             self.scheduler.shutdown()
         self.running = False
+        self._stop_event.set()
+        pid_file_path().unlink(missing_ok=True)
         self.update_daemon_status("stopped")
         self.log_operation("daemon", "stopped", "Daemon shutdown completed")
+        self._flush_logs()
         logger.info("Daemon stopped")
 
     def log_operation(self, operation, status, message=None):
-        """Log sync operation to database"""
-        session = get_session()
+        """Queue a sync operation log entry; entries are written in batches"""
+        row = {
+            "timestamp": datetime.now().isoformat(),
+            "operation": operation,
+            "status": status,
+            "message": message,
+            "activities_processed": 0,  # Can be updated later if needed
+            "activities_downloaded": 0,  # Can be updated later if needed
+        }
+        with self._log_lock:
+            self._log_buf.append(row)
+            flush_now = len(self._log_buf) >= LOG_FLUSH_SIZE
+            if not flush_now and self._log_timer is None:
+                self._log_timer = threading.Timer(LOG_FLUSH_INTERVAL, self._flush_logs)
+                self._log_timer.daemon = True
+                self._log_timer.start()
+        if flush_now:
+            self._flush_logs()
+
+    def _flush_logs(self, conn=None):
+        """Write all buffered SyncLog rows in one Core INSERT
+
+        With conn the rows join that open transaction and errors propagate.
+        """
+        with self._log_lock:
+            rows, self._log_buf = self._log_buf, []
+            if self._log_timer is not None:
+                self._log_timer.cancel()
+                self._log_timer = None
+        if not rows:
+            return
+        if conn is not None:
+            conn.execute(SyncLog.__table__.insert(), rows)
+            return
         try:
-            log = SyncLog(
-                timestamp=datetime.now().isoformat(),
-                operation=operation,
-                status=status,
-                message=message,
-                activities_processed=0,  # Can be updated later if needed
-                activities_downloaded=0,  # Can be updated later if needed
-            )
-            session.add(log)
-            session.commit()
+            with sync_engine.begin() as conn:
+                conn.execute(SyncLog.__table__.insert(), rows)
         except Exception as e:
             logger.error(f"Failed to log operation: {e}")
-        finally:
-            session.close()
 
     def count_missing(self):
         """Count missing activities"""
-        session = get_session()
-        try:
-            return session.query(Activity).filter_by(downloaded=False).count()
-        finally:
-            session.close()
+        with session_scope() as session:
+            return session.scalar(
+                select(func.count())
+                .select_from(Activity)
+                .where(Activity.downloaded == False)
+            )
 
     def reprocess_activities(self):
         """Reprocess activities to calculate missing metrics"""
-        from .database import get_session
-        from .activity_parser import get_activity_metrics
-        from .database import Activity
-        from tqdm import tqdm
-
         logger.info("Starting reprocess job")
-        session = get_session()
         try:
-            # Get activities that need reprocessing
-            activities = session.query(Activity).filter(
-                Activity.downloaded == True,
-                Activity.reprocessed == False
-            ).all()
-
-            if not activities:
-                logger.info("No activities to reprocess")
-                return
+            with session_scope() as session:
+                # Only (id, filename, hash) rows are needed; parsing happens in worker processes
+                rows = session.execute(
+                    select(Activity.activity_id, Activity.filename, Activity.file_hash).where(
+                        Activity.downloaded == True,
+                        Activity.reprocessed == False
+                    )
+                ).all()
+
+                if not rows:
+                    logger.info("No activities to reprocess")
+                    return
 
-            logger.info(f"Reprocessing {len(activities)} activities")
-            success_count = 0
+                logger.info(f"Reprocessing {len(rows)} activities")
+                success_count = 0
             
-            # Reprocess each activity
-            for activity in tqdm(activities, desc="Reprocessing"):
-                try:
-                    # Use force_reprocess=True to ensure we parse the file again
-                    metrics = get_activity_metrics(activity, client=None, force_reprocess=True)
-                    
-                    # Update activity metrics if we got new data
-                    if metrics:
-                        activity.activity_type = metrics.get("activityType", {}).get("typeKey")
-                        activity.duration = int(float(metrics.get("duration", 0))) if metrics.get("duration") else activity.duration
-                        activity.distance = float(metrics.get("distance", 0)) if metrics.get("distance") else activity.distance
-                        activity.max_heart_rate = int(float(metrics.get("maxHR", 0))) if metrics.get("maxHR") else activity.max_heart_rate
-                        activity.avg_heart_rate = int(float(metrics.get("avgHR", 0))) if metrics.get("avgHR") else activity.avg_heart_rate
-                        activity.avg_power = float(metrics.get("avgPower", 0)) if metrics.get("avgPower") else activity.avg_power
-                        activity.calories = int(float(metrics.get("calories", 0))) if metrics.get("calories") else activity.calories
-                    
+                # Reuse the daemon's parse pool rather than spinning up a new one per run
+                # Files whose content hash matches the last good parse are skipped
+                results = self.parse_executor.map(
+                    parse_activity_summary_if_changed,
+                    [row.filename for row in rows],
+                    [row.file_hash for row in rows],
+                    chunksize=16,
+                )
+                pending = []
+                for row, (digest, metrics) in tqdm(zip(rows, results), total=len(rows), desc="Reprocessing"):
                     # Mark as reprocessed regardless of success
-                    activity.reprocessed = True
-                    session.commit()
+                    pending.append(reprocess_update(row.activity_id, metrics, digest))
                     success_count += 1
+                    if len(pending) >= COMMIT_BATCH_SIZE:
+                        flush_activity_updates(session, pending)
+                flush_activity_updates(session, pending)
                     
-                except Exception as e:
-                    logger.error(f"Error reprocessing activity {activity.activity_id}: {str(e)}")
-                    session.rollback()
-                    
-            logger.info(f"Reprocessed {success_count}/{len(activities)} activities successfully")
-            self.log_operation("reprocess", "success", f"Reprocessed {success_count} activities")
-            self.update_daemon_last_run()
+            logger.info(f"Reprocessed {success_count}/{len(rows)} activities successfully")
+            self._complete_run("reprocess", f"Reprocessed {success_count} activities")
             
         except Exception as e:
             logger.error(f"Reprocess job failed: {str(e)}")
             self.log_operation("reprocess", "error", str(e))
-        finally:
-            session.close()
+
+
+_daemon = None
+_daemon_lock = threading.Lock()
+
+
+def get_daemon(create=True):
+    """Daemon shared by the CLI and the web API routes
+
+    Built on first use, so importing this module creates no pools or scheduler.
+    With create=False, returns None if it has not been built yet.
+    """
+    global _daemon
+    with _daemon_lock:
+        if _daemon is None and create:
+            _daemon = GarminSyncDaemon()
+        return _daemon
+
+
+# Scheduled jobs are stored by reference, so they must be importable
+# module-level callables rather than bound methods
+def enqueue_sync():
+    get_daemon()._enqueue_sync()
+
+
+def enqueue_reprocess():
+    get_daemon()._enqueue_reprocess()
@@ -1,27 +1,52 @@
 """Database module for GarminSync application with async support."""
 
+import asyncio
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from contextlib import asynccontextmanager, contextmanager
 
-from sqlalchemy import Boolean, Column, Float, Integer, String
+from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import (Boolean, Column, Float, Integer, String, create_engine,
+                        Index, event, func, tuple_, update)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import async_scoped_session, async_sessionmaker
 from sqlalchemy.future import select
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import selectinload, joinedload
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, validates
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from garminsync.activity_parser import get_activity_metrics
 
 Base = declarative_base()
 
+# Process-local cache of Activity.get_paginated results keyed on
+# (page, per_page); entries expire after PAGE_CACHE_TTL seconds
+PAGE_CACHE_TTL = 60
+PAGE_CACHE_SIZE = 128
+_page_cache = {}
+
+
+def invalidate_page_cache():
+    """Drop cached activity pages after activities are written."""
+    _page_cache.clear()
+
+
 class Activity(Base):
     """Activity model representing a Garmin activity record."""
 
     __tablename__ = "activities"
 
+    # INTEGER PRIMARY KEY aliases SQLite's rowid, so lookups by id already
+    # walk the table's own B-tree; WITHOUT ROWID would gain nothing here
     activity_id = Column(Integer, primary_key=True)
-    start_time = Column(String, nullable=False)
+    start_time = Column(String, nullable=False, index=True)
     activity_type = Column(String, nullable=True)
     duration = Column(Integer, nullable=True)
     distance = Column(Float, nullable=True)
@@ -32,28 +57,79 @@ class Activity(Base):
     filename = Column(String, unique=True, nullable=True)
     downloaded = Column(Boolean, default=False, nullable=False)
     reprocessed = Column(Boolean, default=False, nullable=False)
+    file_hash = Column(String, nullable=True)
     created_at = Column(String, nullable=False)
-    last_sync = Column(String, nullable=True)
+    last_sync = Column(String, nullable=True, index=True)
+
+    # Serves the "missing activities" queries, which filter on downloaded
+    # and keyset-page by activity_id (see iter_missing_activities)
+    __table_args__ = (Index("ix_act_dl_id", "downloaded", "activity_id"),)
 
     @classmethod
-    async def get_paginated(cls, db, page=1, per_page=10):
-        """Get paginated list of activities (async)."""
-        async with db.begin() as session:
-            query = select(cls).order_by(cls.start_time.desc())
-            result = await session.execute(query.offset((page-1)*per_page).limit(per_page))
-            activities = result.scalars().all()
-            count_result = await session.execute(select(select(cls).count()))
-            total = count_result.scalar_one()
-            return {
-                "items": activities,
-                "page": page,
-                "per_page": per_page,
-                "total": total,
-                "pages": (total + per_page - 1) // per_page
-            }
+    async def get_paginated(cls, db, page=1, per_page=10, cursor=None):
+        """Get paginated list of activities (async) using the AsyncSession db.
+
+        Pass the previous page's next_cursor as cursor to seek straight to
+        the following page (keyset pagination) instead of scanning past
+        OFFSET rows; page is then ignored. next_cursor is None on the last
+        page, and a malformed cursor raises ValueError.
+
+        Pages are cached for PAGE_CACHE_TTL seconds and dropped whenever
+        activities are written, so items are plain dicts from to_dict().
+        """
+        key = (page, per_page, cursor)
+        now = time.monotonic()
+        cached = _page_cache.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        # Only the to_dict columns, as plain rows: no ORM objects to build.
+        # activity_id breaks start_time ties so the cursor is unique
+        query = select(*cls.dict_columns()).order_by(
+            cls.start_time.desc(), cls.activity_id.desc()
+        )
+        if cursor is not None:
+            start_time, activity_id = cursor.rsplit("|", 1)
+            query = query.where(
+                tuple_(cls.start_time, cls.activity_id) < (start_time, int(activity_id))
+            )
+        else:
+            query = query.offset((page-1)*per_page)
+        # One extra row tells whether another page follows
+        rows = (await db.execute(query.limit(per_page + 1))).all()
+        activities = [cls.to_dict(row) for row in rows[:per_page]]
+        next_cursor = None
+        if len(rows) > per_page:
+            last = rows[per_page - 1]
+            next_cursor = f"{last.start_time}|{last.activity_id}"
+        count_result = await db.execute(select(func.count()).select_from(cls))
+        total = count_result.scalar_one()
+        pagination = {
+            "items": activities,
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+            "next_cursor": next_cursor,
+        }
+
+        if len(_page_cache) >= PAGE_CACHE_SIZE:
+            _page_cache.clear()
+        _page_cache[key] = (now + PAGE_CACHE_TTL, pagination)
+        return pagination
+
+    @classmethod
+    def dict_columns(cls):
+        """Columns read by to_dict, for queries that skip ORM loading."""
+        return (cls.activity_id, cls.filename, cls.distance, cls.duration,
+                cls.start_time, cls.activity_type, cls.max_heart_rate,
+                cls.avg_heart_rate, cls.avg_power, cls.calories)
 
     def to_dict(self):
-        """Convert activity to dictionary representation."""
+        """Convert activity to dictionary representation.
+
+        Also accepts a result row selected with dict_columns().
+        """
         return {
             "id": self.activity_id,
             "name": self.filename or "Unnamed Activity",
@@ -80,6 +156,14 @@ class DaemonConfig(Base):
     next_run = Column(String, nullable=True)
     status = Column(String, default="stopped", nullable=False)
 
+    @validates("schedule_cron")
+    def _validate_schedule_cron(self, key, value):
+        """Reject cron strings the scheduler could not parse."""
+        if not value or len(value.split()) != 5:
+            raise ValueError(f"Invalid cron schedule: {value!r}")
+        CronTrigger.from_crontab(value)
+        return value
+
     @classmethod
     async def get(cls, db):
         """Get configuration record (async)."""
@@ -94,7 +178,8 @@ class SyncLog(Base):
     __tablename__ = "sync_logs"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    timestamp = Column(String, nullable=False)
+    # Indexed: the log endpoints read newest-first with ORDER BY ... LIMIT
+    timestamp = Column(String, nullable=False, index=True)
     operation = Column(String, nullable=False)
     status = Column(String, nullable=False)
     message = Column(String, nullable=True)
@@ -102,133 +187,426 @@ class SyncLog(Base):
     activities_downloaded = Column(Integer, default=0, nullable=False)
 
 
-# Database initialization and session management
+# Number of activity updates written per transaction in bulk operations
+COMMIT_BATCH_SIZE = 100
+
+# Maximum IDs bound into a single IN (...) lookup; stays under SQLite's
+# host-parameter limit on older builds
+IN_CLAUSE_CHUNK_SIZE = 500
+
+# Missing activities read and downloaded per chunk
+DOWNLOAD_CHUNK_SIZE = 100
+
+# Most recent activities fetched per sync, and the page size they are
+# fetched and committed in
+SYNC_ACTIVITY_LIMIT = 1000
+SYNC_BATCH_SIZE = 100
+
+# Concurrent metric lookups in sync_database; matches the Garmin client's
+# HTTP connection pool size
+METRICS_FETCH_WORKERS = int(os.getenv("CONCURRENT_DOWNLOADS", "8"))
+
+
+def flush_activity_updates(session, pending):
+    """Write a batch of Activity column updates in one transaction and clear it.
+
+    Each entry in pending is a dict holding activity_id plus the columns to set.
+    An ORM bulk UPDATE by primary key runs as a single executemany and skips
+    per-object unit-of-work bookkeeping. If the
+    batch fails it is retried one row at a time; the error is re-raised only
+    when no row could be written.
+    """
+    if not pending:
+        return
+    try:
+        session.execute(update(Activity), pending)
+        session.commit()
+    except SQLAlchemyError:
+        session.rollback()
+        if len(pending) == 1:
+            raise
+        # Retry row by row so one bad row doesn't discard the whole batch
+        failed = 0
+        for row in pending:
+            try:
+                session.execute(update(Activity), [row])
+                session.commit()
+            except SQLAlchemyError as e:
+                session.rollback()
+                failed += 1
+                print(f"Failed to update activity {row.get('activity_id')}: {e}")
+        if failed == len(pending):
+            raise
+    finally:
+        pending.clear()
+        invalidate_page_cache()
+
+
+def iter_missing_activities(session, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Yield (activity_id, start_time) rows for undownloaded activities in chunks.
+
+    Pages by activity_id rather than holding a streaming cursor open, so the
+    caller can commit between chunks (and mark rows downloaded) without
+    invalidating the read. Rows that stay undownloaded are not revisited.
+    """
+    last_id = None
+    while True:
+        stmt = select(Activity.activity_id, Activity.start_time).where(
+            Activity.downloaded == False
+        )
+        if last_id is not None:
+            stmt = stmt.where(Activity.activity_id > last_id)
+        rows = session.execute(
+            stmt.order_by(Activity.activity_id).limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].activity_id
+
+
+def _opt_num(d, key, cast):
+    """Return d[key] converted with cast, or None if the key is missing or None"""
+    value = d.get(key)
+    return cast(value) if value is not None else None
+
+
+def _to_int(value):
+    return int(float(value))
+
+
+# (Activity attribute, summary metrics key, cast) written from parsed metrics
+REPROCESS_FIELDS = (
+    ("duration", "duration", _to_int),
+    ("distance", "distance", float),
+    ("max_heart_rate", "maxHR", _to_int),
+    ("avg_heart_rate", "avgHR", _to_int),
+    ("avg_power", "avgPower", float),
+    ("calories", "calories", _to_int),
+)
+
+
+def metric_columns(metrics):
+    """Coerce summary metrics to Activity column values in one pass.
+
+    Accepts either full activity details or a bare summaryDTO. Only metrics
+    that are present are returned, so stored values are never overwritten
+    with placeholders.
+    """
+    columns = {}
+    if not metrics:
+        return columns
+    activity_type = (metrics.get("activityType") or {}).get("typeKey")
+    if activity_type is not None:
+        columns["activity_type"] = activity_type
+    summary = metrics.get("summaryDTO") or metrics
+    for attr, key, cast in REPROCESS_FIELDS:
+        value = _opt_num(summary, key, cast)
+        if value is not None:
+            columns[attr] = value
+    return columns
+
+
+def reprocess_update(activity_id, metrics, file_hash=None):
+    """Build the bulk UPDATE row marking an activity reprocessed.
+
+    file_hash is stored alongside the metrics so an unchanged file can be
+    skipped next time.
+    """
+    row = {"activity_id": activity_id, "reprocessed": True}
+    if file_hash is not None:
+        row["file_hash"] = file_hash
+    row.update(metric_columns(metrics))
+    return row
+
+
+# Synchronous engine shared by the CLI, daemon and web routes. The enlarged
+# compiled-statement cache keeps the many small repeated queries from being
+# recompiled on every call. LIFO checkout keeps reusing the most recently
+# returned connection, whose SQLite page cache is warm.
+sync_engine = create_engine(
+    f"sqlite:///{os.getenv('DB_PATH', 'data/garmin.db')}",
+    connect_args={"check_same_thread": False},
+    pool_size=8,
+    max_overflow=16,
+    pool_use_lifo=True,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    query_cache_size=1200,
+)
+
+
+@event.listens_for(sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply connection PRAGMAs once per pooled connection."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    # 64 MiB page cache (negative values are KiB)
+    cursor.execute("PRAGMA cache_size=-64000")
+    # Memory-map up to 256 MiB of the database file for reads
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+
+# Sessions are short-lived and this process is the only writer, so loaded
+# attributes stay valid after commit; don't expire them (as the async side)
+SessionLocal = sessionmaker(bind=sync_engine, expire_on_commit=False)
+
+
+def get_session():
+    """Return a new synchronous database session.
+
+    Every call gets its own session. The async web routes all run on the
+    event loop thread, so a thread-scoped session here would be shared
+    between concurrent requests.
+    """
+    return SessionLocal()
+
+
+@contextmanager
+def session_scope():
+    """Synchronous session that commits on success and rolls back on error."""
+    session = SessionLocal()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+# Async engine for the async helpers (get_db, get_paginated, DaemonConfig.get),
+# created on first use
 engine = None
 async_session = None
 
-async def init_db():
-    """Initialize database connection and create tables."""
+def init_async_db():
+    """Initialize the async database connection."""
+    global engine, async_session
+    if async_session is None:
+        db_path = os.getenv("DB_PATH", "data/garmin.db")
+        # aiosqlite does not pick a queue pool by default, so ask for one
+        # explicitly; SQLite serialises writers, so a small pool suffices
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{db_path}",
+            connect_args={"check_same_thread": False},
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=5,
+            max_overflow=10,
+            pool_recycle=1800,
+            pool_pre_ping=True,
+        )
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+        # One session per asyncio task, so concurrent requests on the event
+        # loop thread never share a session
+        async_session = async_scoped_session(
+            async_sessionmaker(engine, expire_on_commit=False),
+            scopefunc=asyncio.current_task,
+        )
+    return async_session
+
+
+async def close_async_db():
+    """Dispose the async engine; pooled aiosqlite connections keep worker
+    threads alive, which would otherwise block interpreter exit."""
     global engine, async_session
-    db_path = os.getenv("DB_PATH", "data/garmin.db")
-    engine = create_async_engine(
-        f"sqlite+aiosqlite:///{db_path}",
-        pool_size=10, 
-        max_overflow=20,
-        pool_pre_ping=True
-    )
-    async_session = async_sessionmaker(engine, expire_on_commit=False)
-    
-    # Create tables if they don't exist
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if engine is not None:
+        await engine.dispose()
+    engine = None
+    async_session = None
 
 
-@asynccontextmanager
-async def get_db():
-    """Async context manager for database sessions."""
-    async with async_session() as session:
-        try:
-            yield session
-            await session.commit()
-        except SQLAlchemyError:
-            await session.rollback()
-            raise
+_schema_lock = threading.Lock()
+_schema_ready = False
+
 
+def init_db():
+    """Create tables if they don't exist and return the shared engine.
 
-# Compatibility layer for legacy sync functions
-def get_legacy_session():
-    """Temporary synchronous session for migration purposes."""
-    db_path = os.getenv("DB_PATH", "data/garmin.db")
-    sync_engine = create_engine(f"sqlite:///{db_path}")
-    Base.metadata.create_all(sync_engine)
-    Session = sessionmaker(bind=sync_engine)
-    return Session()
+    The CREATE TABLE IF NOT EXISTS pass runs once per process; later calls
+    only hand back the cached engine.
+    """
+    global _schema_ready
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                Base.metadata.create_all(sync_engine)
+                _schema_ready = True
+    return sync_engine
 
 
-async def sync_database(garmin_client):
-    """Sync local database with Garmin Connect activities (async)."""
-    from garminsync.activity_parser import get_activity_metrics
+@asynccontextmanager
+async def get_db():
+    """Async context manager for the current task's database session."""
+    registry = init_async_db()
+    session = registry()
+    try:
+        yield session
+        await session.commit()
+    except SQLAlchemyError:
+        await session.rollback()
+        raise
+    finally:
+        await registry.remove()
+
+
+async def get_db_session():
+    """FastAPI dependency yielding get_db()'s session for one request."""
     async with get_db() as session:
-        try:
-            activities = garmin_client.get_activities(0, 1000)
-
-            if not activities:
-                print("No activities returned from Garmin API")
-                return
-
-            for activity_data in activities:
-                if not isinstance(activity_data, dict):
-                    print(f"Invalid activity data: {activity_data}")
-                    continue
-
-                activity_id = activity_data.get("activityId")
-                start_time = activity_data.get("startTimeLocal")
-                
-                if not activity_id or not start_time:
-                    print(f"Missing required fields in activity: {activity_data}")
-                    continue
-
-                result = await session.execute(
-                    select(Activity).filter_by(activity_id=activity_id)
+        yield session
+
+
+def iter_activity_batches(garmin_client, limit=SYNC_ACTIVITY_LIMIT,
+                          batch_size=SYNC_BATCH_SIZE):
+    """Yield the most recent activities from Garmin Connect a page at a time.
+
+    Stops after limit activities or at the first short page.
+    """
+    start = 0
+    while start < limit:
+        count = min(batch_size, limit - start)
+        batch = garmin_client.get_activities(start, count)
+        if not batch:
+            return
+        yield batch
+        if len(batch) < count:
+            return
+        start += len(batch)
+
+
+def _sync_activity_batch(session, garmin_client, activities, pool, now):
+    """Upsert one page of Garmin activities stamped with now; the caller commits."""
+    # activity_id -> start_time; later duplicates in the response win
+    synced = {}
+    for activity_data in activities:
+        if not isinstance(activity_data, dict):
+            print(f"Invalid activity data: {activity_data}")
+            continue
+
+        activity_id = activity_data.get("activityId")
+        start_time = activity_data.get("startTimeLocal")
+        
+        if not activity_id or not start_time:
+            print(f"Missing required fields in activity: {activity_data}")
+            continue
+
+        synced[activity_id] = start_time
+
+    # Find the activities already stored with one IN query per chunk
+    # rather than a SELECT per activity
+    ids = list(synced)
+    existing = {}
+    for start in range(0, len(ids), IN_CLAUSE_CHUNK_SIZE):
+        chunk = ids[start:start + IN_CLAUSE_CHUNK_SIZE]
+        existing.update(session.execute(
+            select(Activity.activity_id, Activity.filename)
+            .where(Activity.activity_id.in_(chunk))
+        ).all())
+
+    def fetch_metrics(activity_id):
+        # Update metrics using shared parser
+        return get_activity_metrics(
+            SimpleNamespace(activity_id=activity_id,
+                            filename=existing.get(activity_id)),
+            garmin_client,
+        )
+
+    # Activities without a local file fall back to an API call each, so
+    # overlap those round trips; the DB writes below stay on this thread
+    all_metrics = list(pool.map(fetch_metrics, synced))
+
+    rows = []
+    for (activity_id, start_time), metrics in zip(synced.items(), all_metrics):
+        activity_type = None
+        if metrics:
+            activity_type = (metrics.get("activityType") or {}).get("typeKey")
+
+        rows.append({
+            "activity_id": activity_id,
+            "start_time": start_time,
+            "activity_type": activity_type,
+            "downloaded": False,
+            "created_at": now,
+            "last_sync": now,
+        })
+
+    # One executemany UPSERT: new activities are inserted, existing ones
+    # only get last_sync and (when known) activity_type refreshed. Built
+    # on the Table so it runs as plain Core rather than row-by-row ORM
+    if rows:
+        stmt = sqlite_insert(Activity.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["activity_id"],
+            set_={
+                "last_sync": stmt.excluded.last_sync,
+                "activity_type": func.coalesce(
+                    stmt.excluded.activity_type, Activity.activity_type
+                ),
+            },
+        )
+        session.execute(stmt, rows)
+
+
+def sync_database(garmin_client):
+    """Sync local database with Garmin Connect activities.
+
+    Activities are fetched and written a page at a time, committing after
+    each page, so memory stays bounded by SYNC_BATCH_SIZE.
+    """
+    session = get_session()
+    try:
+        # One timestamp for the whole run, so every activity touched by this
+        # sync shares the same last_sync
+        now = datetime.now().isoformat()
+        synced_any = False
+        with ThreadPoolExecutor(max_workers=METRICS_FETCH_WORKERS) as pool:
+            for activities in iter_activity_batches(garmin_client):
+                synced_any = True
+                _sync_activity_batch(
+                    session, garmin_client, activities, pool, now
                 )
-                existing = result.scalars().first()
-                
-                # Create or update basic activity info
-                if not existing:
-                    activity = Activity(
-                        activity_id=activity_id,
-                        start_time=start_time,
-                        downloaded=False,
-                        created_at=datetime.now().isoformat(),
-                        last_sync=datetime.now().isoformat(),
-                    )
-                    session.add(activity)
-                else:
-                    activity = existing
-                
-                # Update metrics using shared parser
-                metrics = get_activity_metrics(activity, garmin_client)
-                if metrics:
-                    activity.activity_type = metrics.get("activityType", {}).get("typeKey")
-                    # ... rest of metric processing ...
-                
-                # Update sync timestamp
-                activity.last_sync = datetime.now().isoformat()
-
-            await session.commit()
-        except SQLAlchemyError as e:
-            await session.rollback()
-            raise e
-
-
-async def get_offline_stats():
-    """Return statistics about cached data without API calls (async)."""
-    async with get_db() as session:
-        try:
-            result = await session.execute(select(Activity))
-            total = len(result.scalars().all())
-            
-            result = await session.execute(
-                select(Activity).filter_by(downloaded=True)
-            )
-            downloaded = len(result.scalars().all())
-            
-            result = await session.execute(
-                select(Activity).order_by(Activity.last_sync.desc())
-            )
-            last_sync = result.scalars().first()
-            
-            return {
-                "total": total,
-                "downloaded": downloaded,
-                "missing": total - downloaded,
-                "last_sync": last_sync.last_sync if last_sync else "Never synced",
-            }
-        except SQLAlchemyError as e:
-            print(f"Database error: {e}")
-            return {
-                "total": 0,
-                "downloaded": 0,
-                "missing": 0,
-                "last_sync": "Error"
-            }
+                session.commit()
+                invalidate_page_cache()
+
+        if not synced_any:
+            print("No activities returned from Garmin API")
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise e
+    finally:
+        session.close()
+
+
+def get_offline_stats():
+    """Return statistics about cached data without API calls."""
+    session = get_session()
+    try:
+        # One aggregate query instead of loading every row to count it
+        total, downloaded, last_sync = session.execute(
+            select(
+                func.count(),
+                func.count().filter(Activity.downloaded == True),
+                func.max(Activity.last_sync),
+            ).select_from(Activity)
+        ).one()
+        
+        return {
+            "total": total,
+            "downloaded": downloaded,
+            "missing": total - downloaded,
+            "last_sync": last_sync or "Never synced",
+        }
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return {
+            "total": 0,
+            "downloaded": 0,
+            "missing": 0,
+            "last_sync": "Error"
+        }
+    finally:
+        session.close()
@@ -5,56 +5,54 @@ class SinglespeedAnalyzer:
         self.chainring_options = [38, 46]  # teeth
         self.common_cogs = list(range(11, 28))  # 11t to 27t rear cogs
         self.wheel_circumference_m = 2.096  # 700x25c tire
+        
+        # The chainring/cog ratio table is the same for every activity: keep
+        # its distinct ratios sorted, each with the first (ring, cog) in
+        # chainring-then-cog order that produces it
+        rings = np.asarray(self.chainring_options)
+        cogs = np.asarray(self.common_cogs)
+        self._sorted_ratios, first = np.unique(
+            (rings[:, None] / cogs[None, :]).ravel(), return_index=True
+        )
+        self._ratio_gears = [
+            (int(rings[i // cogs.size]), int(cogs[i % cogs.size])) for i in first
+        ]
+        self._ratio_order = first
     
     def analyze_gear_ratio(self, speed_data, cadence_data, gradient_data):
         """Determine most likely singlespeed gear ratio"""
         # Validate input parameters
-        if not speed_data or not cadence_data or not gradient_data:
+        if len(speed_data) == 0 or len(cadence_data) == 0 or len(gradient_data) == 0:
             raise ValueError("Input data cannot be empty")
         if len(speed_data) != len(cadence_data) or len(speed_data) != len(gradient_data):
             raise ValueError("Input data arrays must be of equal length")
             
-        # Filter for flat terrain segments (gradient < 3%)
-        flat_indices = [i for i, grad in enumerate(gradient_data) if abs(grad) < 3.0]
-        flat_speeds = [speed_data[i] for i in flat_indices]
-        flat_cadences = [cadence_data[i] for i in flat_indices]
-        
-        # Only consider data points with sufficient speed (15 km/h) and cadence
-        valid_indices = [i for i in range(len(flat_speeds)) 
-                         if flat_speeds[i] > 4.17 and flat_cadences[i] > 0]  # 15 km/h threshold
-        
-        if not valid_indices:
+        speeds = np.asarray(speed_data, dtype=np.float64)
+        cadences = np.asarray(cadence_data, dtype=np.float64)
+        gradients = np.asarray(gradient_data, dtype=np.float64)
+
+        # Flat terrain (gradient < 3%) with sufficient speed (15 km/h) and cadence
+        valid = (np.abs(gradients) < 3.0) & (speeds > 4.17) & (cadences > 0)
+        if not valid.any():
             return None  # Not enough data
-        
-        valid_speeds = [flat_speeds[i] for i in valid_indices]
-        valid_cadences = [flat_cadences[i] for i in valid_indices]
-        
-        # Calculate gear ratios from speed and cadence
-        gear_ratios = []
-        for speed, cadence in zip(valid_speeds, valid_cadences):
-            # Gear ratio = (speed in m/s * 60 seconds/minute) / (cadence in rpm * wheel circumference in meters)
-            gr = (speed * 60) / (cadence * self.wheel_circumference_m)
-            gear_ratios.append(gr)
-        
-        # Calculate average gear ratio
-        avg_gear_ratio = sum(gear_ratios) / len(gear_ratios)
-        
-        # Find best matching chainring and cog combination
-        best_fit = None
-        min_diff = float('inf')
-        for chainring in self.chainring_options:
-            for cog in self.common_cogs:
-                theoretical_ratio = chainring / cog
-                diff = abs(theoretical_ratio - avg_gear_ratio)
-                if diff < min_diff:
-                    min_diff = diff
-                    best_fit = (chainring, cog, theoretical_ratio)
-        
-        if not best_fit:
-            return None
-        
-        chainring, cog, ratio = best_fit
-        
+
+        # Gear ratio = (speed in m/s * 60 seconds/minute) / (cadence in rpm * wheel circumference in meters)
+        gear_ratios = (speeds[valid] * 60) / (cadences[valid] * self.wheel_circumference_m)
+        avg_gear_ratio = gear_ratios.mean()
+
+        # Find best matching chainring and cog combination: the closest ratio
+        # is one of the two neighbours of the insertion point. On a tie the
+        # combination that comes first in chainring-then-cog order wins
+        pos = int(np.searchsorted(self._sorted_ratios, avg_gear_ratio))
+        candidates = [i for i in (pos - 1, pos) if 0 <= i < self._sorted_ratios.size]
+        best = min(
+            candidates,
+            key=lambda i: (abs(self._sorted_ratios[i] - avg_gear_ratio), self._ratio_order[i]),
+        )
+        min_diff = float(abs(self._sorted_ratios[best] - avg_gear_ratio))
+        chainring, cog = self._ratio_gears[best]
+        ratio = chainring / cog
+
         # Calculate gear metrics
         wheel_diameter_inches = 27.0  # 700c wheel diameter
         gear_inches = ratio * wheel_diameter_inches
@@ -1,5 +1,20 @@
+import importlib.util
+import math
+from functools import lru_cache
+
 import numpy as np
 
+HAS_NUMBA = importlib.util.find_spec('numba') is not None
+# Below this many samples the NumPy path is faster than the JIT dispatch
+NUMBA_MIN_SAMPLES = 20000
+
+def air_density(air_temp_c, altitude_m):
+    """Air density (kg/m³) from temperature and altitude; accepts arrays"""
+    temp_k = air_temp_c + 273.15
+    pressure = 101325 * (1 - 0.0000225577 * altitude_m) ** 5.25588
+    return pressure / (287.05 * temp_k)
+
+
 class PowerEstimator:
     def __init__(self):
         self.bike_weight_kg = 10.0  # 22 lbs
@@ -10,6 +25,10 @@ class PowerEstimator:
         self.drivetrain_efficiency = 0.97
         self.air_density = 1.225  # kg/m³ at sea level, 20°C
     
+    # Memoized for scalar callers: a ride sees few distinct (temperature,
+    # altitude) pairs and the pressure term's pow() dominates one estimate
+    _air_density = staticmethod(lru_cache(maxsize=128)(air_density))
+    
     def calculate_power(self, speed_ms, gradient_percent, 
                        air_temp_c=20, altitude_m=0):
         """Calculate estimated power using physics model"""
@@ -19,26 +38,106 @@ class PowerEstimator:
         if not isinstance(gradient_percent, (int, float)):
             raise ValueError("Gradient must be a number")
         
-        # Calculate air density based on temperature and altitude
-        temp_k = air_temp_c + 273.15
-        pressure = 101325 * (1 - 0.0000225577 * altitude_m) ** 5.25588
-        air_density = pressure / (287.05 * temp_k)
-        
-        # Convert gradient to angle
-        gradient_rad = np.arctan(gradient_percent / 100.0)
+        return self.calculate_power_fast(
+            speed_ms, gradient_percent, self._air_density(air_temp_c, altitude_m)
+        )
+
+    def calculate_power_fast(self, speed_ms, gradient_percent, air_density):
+        """calculate_power without input validation, for per-sample loops
+
+        air_density comes from the caller (see air_density()) so it can be
+        computed once per stretch of samples.
+        """
+        # Convert gradient to angle; math avoids NumPy's per-call overhead on
+        # scalars (use calculate_power_batch for whole rides)
+        gradient_rad = math.atan(gradient_percent / 100.0)
         
         # Total mass
         total_mass = self.bike_weight_kg + self.rider_weight_kg
         
         # Power components
-        P_roll = self.rolling_resistance * total_mass * 9.81 * np.cos(gradient_rad) * speed_ms
-        P_grav = total_mass * 9.81 * np.sin(gradient_rad) * speed_ms
+        P_roll = self.rolling_resistance * total_mass * 9.81 * math.cos(gradient_rad) * speed_ms
+        P_grav = total_mass * 9.81 * math.sin(gradient_rad) * speed_ms
         P_aero = 0.5 * air_density * self.drag_coefficient * self.frontal_area_m2 * speed_ms ** 3
         
         # Power = (Rolling + Gravity + Aerodynamic) / Drivetrain efficiency
         return (P_roll + P_grav + P_aero) / self.drivetrain_efficiency
 
+    def calculate_power_batch(self, speeds_ms, gradients_percent,
+                              air_temp_c=20, altitude_m=0):
+        """Vectorised calculate_power over whole speed/gradient arrays"""
+        speeds_ms = np.asarray(speeds_ms, dtype=np.float64)
+        gradients_percent = np.asarray(gradients_percent, dtype=np.float64)
+        
+        # Validate input parameters
+        if speeds_ms.shape != gradients_percent.shape:
+            raise ValueError("Speed and gradient arrays must be of equal length")
+        if np.any(speeds_ms < 0):
+            raise ValueError("Speed must be a non-negative number")
+        
+        rho = air_density(air_temp_c, altitude_m)
+        
+        gradient_rad = np.arctan(gradients_percent / 100.0)
+        total_mass = self.bike_weight_kg + self.rider_weight_kg
+        
+        # Rolling + gravity share the m*g*v factor; aero scales with v^3
+        weight_force = total_mass * 9.81
+        resistive = weight_force * (
+            self.rolling_resistance * np.cos(gradient_rad) + np.sin(gradient_rad)
+        )
+        aero = 0.5 * rho * self.drag_coefficient * self.frontal_area_m2 * speeds_ms ** 2
+        
+        return (resistive + aero) * speeds_ms / self.drivetrain_efficiency
+
     def estimate_peak_power(self, power_values, durations):
-        """Calculate peak power for various durations"""
-        # This will be implemented in Phase 3
-        return {}
+        """Calculate peak power for various durations
+
+        :param power_values: Power samples in watts, one per second
+        :param durations: Window lengths in samples (seconds)
+        :return: Dict of duration -> best mean power over any window of that
+            length; durations longer than the ride are left out
+        """
+        power = np.asarray(power_values, dtype=np.float64)
+        windows = np.array(
+            sorted({int(d) for d in durations if 0 < int(d) <= power.size}),
+            dtype=np.int64,
+        )
+        if not windows.size:
+            return {}
+        
+        if HAS_NUMBA and power.size > NUMBA_MIN_SAMPLES:
+            peaks = _peak_power_kernel()(power, windows)
+        else:
+            # Window sums from one cumulative sum; O(N) per duration
+            cumsum = np.concatenate(([0.0], np.cumsum(power)))
+            peaks = [(cumsum[d:] - cumsum[:-d]).max() / d for d in windows]
+        
+        return {int(d): float(p) for d, p in zip(windows, peaks)}
+
+
+@lru_cache(maxsize=None)
+def _peak_power_kernel():
+    """Build the Numba kernel on first use so numba is only imported when needed"""
+    from numba import njit, prange
+    
+    @njit(cache=True, fastmath=True, parallel=True)
+    def peak_power(power, windows):
+        """Best mean power for each window length, durations in parallel"""
+        cumsum = np.empty(power.size + 1)
+        cumsum[0] = 0.0
+        for i in range(power.size):
+            cumsum[i + 1] = cumsum[i] + power[i]
+        
+        out = np.empty(windows.size)
+        for k in prange(windows.size):
+            d = windows[k]
+            # Seed with the first window; fastmath assumes no infinities
+            best = cumsum[d] / d
+            for i in range(1, power.size - d + 1):
+                mean = (cumsum[i + d] - cumsum[i]) / d
+                if mean > best:
+                    best = mean
+            out[k] = best
+        return out
+    
+    return peak_power
@@ -1,21 +1,160 @@
 """Garmin API client module for GarminSync application."""
 
+import importlib.util
+import json
 import logging
 import os
+import random
+import shutil
+import tempfile
+import threading
 import time
 
 from garminconnect import (Garmin, GarminConnectAuthenticationError,
                            GarminConnectConnectionError,
                            GarminConnectTooManyRequestsError)
 
+from .utils import DATA_DIR
+
 logger = logging.getLogger(__name__)
 
+# Maximum number of activity files fetched at once
+CONCURRENT_DOWNLOADS = int(os.getenv("CONCURRENT_DOWNLOADS", "8"))
+
+# Where garth's OAuth tokens are saved so later runs skip the SSO login;
+# under the data directory by default so Docker runs keep them
+TOKEN_DIR = os.path.expanduser(os.getenv(
+    "GARMIN_TOKEN_DIR", os.path.join(DATA_DIR, ".garth")
+))
+
+# Activity details fetched from the API are kept as JSON for this long; past
+# activities don't change, so reruns can skip the API entirely
+ACTIVITY_CACHE_DIR = os.path.join(DATA_DIR, "activity_cache")
+ACTIVITY_CACHE_TTL = int(os.getenv("ACTIVITY_CACHE_TTL_DAYS", "30")) * 86400
+
+# Sustained Garmin Connect API calls per second, and how many may burst
+API_RATE = float(os.getenv("GARMIN_API_RATE", "1.0"))
+API_BURST = int(os.getenv("GARMIN_API_BURST", "5"))
+
+
+class _RateLimiter:
+    """Thread-safe token bucket with multiplicative backoff on HTTP 429
+
+    acquire() only sleeps once the bucket is empty. Each 429 doubles an
+    extra minimum spacing between calls (up to max_interval); each success
+    halves it again, so the client settles just under Garmin's real limit.
+    """
+
+    def __init__(self, rate, capacity, max_interval=60.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_interval = max_interval
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self.min_interval = 0.0
+        self.next_allowed = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the next API call may be made"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.last_refill) * self.rate
+            )
+            self.last_refill = now
+            # Take a token now; a negative balance reserves a future slot
+            self.tokens -= 1
+            start = now + max(0.0, -self.tokens / self.rate)
+            start = max(start, self.next_allowed)
+            self.next_allowed = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+    def success(self):
+        """Record an accepted call; relax any backoff"""
+        with self._lock:
+            self.min_interval = 0.0 if self.min_interval < 0.1 else self.min_interval / 2
+
+    def backoff(self):
+        """Record a 429; space calls further apart and drain the burst"""
+        with self._lock:
+            self.min_interval = min(max(self.min_interval * 2, 1.0), self.max_interval)
+            self.tokens = min(self.tokens, 0.0)
+
+
+# Shared by every client in the process: Garmin limits per account
+_rate_limiter = _RateLimiter(API_RATE, API_BURST)
+
+
+def _is_rate_limited(exc):
+    """True for a Garmin 429, raised directly or wrapped in an HTTP error"""
+    if isinstance(exc, GarminConnectTooManyRequestsError):
+        return True
+    # requests.HTTPError carries .response; garth's GarthHTTPError wraps one in .error
+    for err in (exc, getattr(exc, "error", None)):
+        response = getattr(err, "response", None)
+        if getattr(response, "status_code", None) == 429:
+            return True
+    # parfive wraps the failing aiohttp response in FailedDownload.exception
+    while exc is not None:
+        if getattr(exc, "status", None) == 429:
+            return True
+        exc = getattr(exc, "exception", None)
+    return False
+
+
+def _with_backoff(fn, retries=3, base=10):
+    """Call fn, retrying on HTTP 429 with exponential backoff plus jitter
+
+    Waits base, 2*base, ... seconds (plus up to base/2 of jitter) between
+    attempts; the final 429 and any other error propagate unchanged.
+    """
+    for attempt in range(retries):
+        try:
+            return fn()
+        except Exception as e:  # pylint: disable=broad-except
+            if not _is_rate_limited(e) or attempt == retries - 1:
+                raise
+            _rate_limiter.backoff()
+            delay = base * 2 ** attempt + random.uniform(0, base / 2)
+            logger.warning("Rate limited by Garmin Connect; retrying in %.0fs", delay)
+            time.sleep(delay)
+
+
+def _read_cached_details(path):
+    """Cached activity details at path, or None if missing, stale or unreadable"""
+    try:
+        if time.time() - os.stat(path).st_mtime > ACTIVITY_CACHE_TTL:
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cached_details(path, details):
+    """Store activity details; written to a temp file and renamed so
+    concurrent readers never see a partial file"""
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(details, f)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning("Could not cache activity details at %s: %s", path, e)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
 
 class GarminClient:
     """Garmin API client for interacting with Garmin Connect services."""
 
     def __init__(self):
         self.client = None
+        # Index of the download method that last worked; tried first next time
+        self._last_good_method = 0
 
     def authenticate(self):
         """Authenticate using credentials from environment variables"""
@@ -27,7 +166,17 @@ class GarminClient:
 
         try:
             self.client = Garmin(email, password)
-            self.client.login()
+            # One keep-alive pool with retries for every Garmin Connect call
+            self.client.garth.configure(
+                retries=3,
+                backoff_factor=0.3,
+                pool_connections=CONCURRENT_DOWNLOADS,
+                pool_maxsize=CONCURRENT_DOWNLOADS,
+            )
+            if not self._resume_session():
+                # Garmin SSO answers repeated logins with 429
+                _with_backoff(self.client.login)
+                self._save_session()
             logger.info("Successfully authenticated with Garmin Connect")
             return self.client
         except GarminConnectAuthenticationError as e:
@@ -40,6 +189,32 @@ class GarminClient:
             logger.error("Unexpected error during authentication: %s", e)
             raise RuntimeError(f"Unexpected error during authentication: {e}") from e
 
+    def _resume_session(self):
+        """Log in with tokens saved by an earlier run; False if that fails"""
+        if not os.path.exists(os.path.join(TOKEN_DIR, "oauth1_token.json")):
+            return False
+        try:
+            _with_backoff(lambda: self.client.login(TOKEN_DIR))
+            logger.info("Resumed saved Garmin Connect session")
+            return True
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("Saved Garmin session unusable, logging in again: %s", e)
+            return False
+
+    def _save_session(self):
+        """Save OAuth tokens so the next run can skip the SSO login"""
+        try:
+            self.client.garth.dump(TOKEN_DIR)
+        except OSError as e:
+            logger.warning("Could not save Garmin session to %s: %s", TOKEN_DIR, e)
+
+    @property
+    def session(self):
+        """The requests.Session shared by all Garmin Connect API calls"""
+        if not self.client:
+            self.authenticate()
+        return self.client.garth.sess
+
     def get_activities(self, start=0, limit=10):
         """Get list of activities with rate limiting
 
@@ -59,11 +234,16 @@ class GarminClient:
             self.authenticate()
 
         try:
+            _rate_limiter.acquire()
             activities = self.client.get_activities(start, limit)
-            time.sleep(2)  # Rate limiting
+            _rate_limiter.success()
             logger.info("Retrieved %d activities", len(activities) if activities else 0)
             return activities
-        except (GarminConnectConnectionError, TimeoutError, GarminConnectTooManyRequestsError) as e:
+        except GarminConnectTooManyRequestsError as e:
+            _rate_limiter.backoff()
+            logger.error("Rate limited while fetching activities: %s", e)
+            raise ConnectionError(f"Failed to fetch activities: {e}") from e
+        except (GarminConnectConnectionError, TimeoutError) as e:
             logger.error("Network error while fetching activities: %s", e)
             raise ConnectionError(f"Failed to fetch activities: {e}") from e
         except Exception as e:  # pylint: disable=broad-except
@@ -90,17 +270,24 @@ class GarminClient:
 
         last_exception = None
 
-        for i, method in enumerate(methods_to_try, 1):
+        # Start with the method that worked last; the rest keep their order
+        start = self._last_good_method
+        order = list(range(start, len(methods_to_try))) + list(range(start))
+
+        for idx in order:
+            i, method = idx + 1, methods_to_try[idx]
             try:
                 # Try the download method
                 print(f"Trying download method {i}...")
-                fit_data = method()
+                _rate_limiter.acquire()
+                fit_data = _with_backoff(method)
+                _rate_limiter.success()
 
                 if fit_data:
                     print(
                         f"Successfully downloaded {len(fit_data)} bytes using method {i}"
                     )
-                    time.sleep(2)  # Rate limiting
+                    self._last_good_method = idx
                     return fit_data
                 print(f"Method {i} returned empty data")
 
@@ -111,6 +298,8 @@ class GarminClient:
                 continue
             # Catch all other exceptions as a fallback
             except (TimeoutError, GarminConnectTooManyRequestsError) as e:
+                if isinstance(e, GarminConnectTooManyRequestsError):
+                    _rate_limiter.backoff()
                 print(f"Method {i} failed with retryable error: {e}")
                 last_exception = e
                 continue
@@ -121,6 +310,7 @@ class GarminClient:
                 continue
 
         # If all methods failed, raise the last exception
+        self._last_good_method = 0
         if last_exception:
             raise RuntimeError(
                 f"All download methods failed. Last error: {last_exception}"
@@ -129,6 +319,58 @@ class GarminClient:
             "All download methods failed, but no specific error was captured"
         )
 
+    def activity_download_url(self, activity_id):
+        """Absolute URL of the file download_activity_fit fetches first"""
+        if not self.client:
+            self.authenticate()
+
+        # Same endpoint as download_activity's default format
+        return (
+            f"https://connectapi.{self.client.garth.domain}"
+            f"{self.client.garmin_connect_tcx_download}/{activity_id}"
+        )
+
+    def stream_activity_fit(self, activity_id, dest_path, chunk_size=1 << 16):
+        """Download an activity file straight to disk
+
+        Args:
+            activity_id: ID of the activity to download
+            dest_path: File path to write
+            chunk_size: Bytes buffered per read; memory use is independent
+                of the file size
+
+        Raises:
+            requests.RequestException: If the download fails; no partial
+                file is left behind
+        """
+        url = self.activity_download_url(activity_id)
+        _rate_limiter.acquire()
+        try:
+            with self.session.get(url, headers=self.auth_headers(), stream=True) as response:
+                if response.status_code == 429:
+                    _rate_limiter.backoff()
+                response.raise_for_status()
+                response.raw.decode_content = True
+                with open(dest_path, "wb") as f:
+                    shutil.copyfileobj(response.raw, f, chunk_size)
+        except Exception:
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+            raise
+        _rate_limiter.success()
+
+    def auth_headers(self):
+        """HTTP headers authorising direct requests to Garmin Connect"""
+        if not self.client:
+            self.authenticate()
+
+        garth_client = self.client.garth
+        if getattr(garth_client.oauth2_token, "expired", True):
+            garth_client.refresh_oauth2()
+        headers = dict(garth_client.sess.headers)
+        headers["Authorization"] = str(garth_client.oauth2_token)
+        return headers
+
     def get_activity_details(self, activity_id):
         """Get detailed information about a specific activity
 
@@ -138,14 +380,26 @@ class GarminClient:
         Returns:
             Activity details dictionary or None if failed
         """
+        cache_path = os.path.join(ACTIVITY_CACHE_DIR, f"{activity_id}.json")
+        cached = _read_cached_details(cache_path)
+        if cached is not None:
+            return cached
+
         if not self.client:
             self.authenticate()
 
         try:
+            _rate_limiter.acquire()
             activity_details = self.client.get_activity(activity_id)
-            time.sleep(2)  # Rate limiting
+            _rate_limiter.success()
             logger.info("Retrieved details for activity %s", activity_id)
+            if activity_details:
+                _write_cached_details(cache_path, activity_details)
             return activity_details
+        except GarminConnectTooManyRequestsError as e:
+            _rate_limiter.backoff()
+            logger.error("Rate limited fetching activity details for %s: %s", activity_id, e)
+            return None
         except (GarminConnectConnectionError, TimeoutError) as e:
             logger.error(
                 "Connection/timeout error fetching activity details for %s: %s",
@@ -159,24 +413,92 @@ class GarminClient:
     # Example usage and testing function
 
 
-def test_download(activity_id):
-    """Test function to verify download functionality"""
+def download_activities(client, jobs, on_done=None, concurrency=CONCURRENT_DOWNLOADS,
+                        progress=False):
+    """Download activity files concurrently
+
+    Files are fetched in rounds of at most concurrency downloads. Each file
+    takes a token from the shared rate limiter before its round starts, and
+    a 429 in a round slows the limiter down for the next one.
+
+    Args:
+        client: Authenticated (or authenticatable) GarminClient
+        jobs: Iterable of (key, activity_id, filepath) tuples
+        on_done: Optional callback(key, filepath, error) invoked on the calling
+            thread for each job once all downloads finish; error is None on success
+        concurrency: Maximum number of simultaneous downloads
+        progress: Draw parfive progress bars; only for interactive use
+    """
+    from parfive import Downloader, SessionConfig
+
+    jobs = list(jobs)
+    if not jobs:
+        return
+
+    # Resolve auth once; every request shares the same session headers
+    config = SessionConfig(
+        headers=client.auth_headers(),
+        # With aiofiles, chunks are written from a thread pool instead of
+        # blocking the event loop that drives the other transfers
+        use_aiofiles=importlib.util.find_spec("aiofiles") is not None,
+    )
+    by_url = {}
+    failed = {}
+    for start in range(0, len(jobs), concurrency):
+        downloader = Downloader(
+            max_conn=concurrency, progress=progress, overwrite=True, config=config
+        )
+        for key, activity_id, filepath in jobs[start:start + concurrency]:
+            url = client.activity_download_url(activity_id)
+            by_url[url] = (key, filepath)
+            _rate_limiter.acquire()
+            downloader.enqueue_file(url, path=os.path.dirname(filepath) or ".",
+                                    filename=os.path.basename(filepath))
+
+        results = downloader.download()
+
+        for error in results.errors:
+            failed[error.url] = error.exception
+            # Don't leave a truncated file behind
+            filepath = by_url[error.url][1]
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        if any(_is_rate_limited(error.exception) for error in results.errors):
+            _rate_limiter.backoff()
+        else:
+            _rate_limiter.success()
+    if on_done:
+        for url, (key, filepath) in by_url.items():
+            on_done(key, filepath, failed.get(url))
+
+
+def test_download(activity_id, dest_path=None):
+    """Test function to verify download functionality
+
+    The file is streamed to dest_path (a temporary file by default) and only
+    its header is read back, so the download is never held in memory.
+    Returns the file path, or None if the download failed.
+    """
     client = GarminClient()
+    if dest_path is None:
+        fd, dest_path = tempfile.mkstemp(suffix=".fit")
+        os.close(fd)
     try:
-        fit_data = client.download_activity_fit(activity_id)
+        client.stream_activity_fit(activity_id, dest_path)
 
         # Verify the data looks like a FIT file
-        if not fit_data or len(fit_data) <= 14:
+        if os.path.getsize(dest_path) <= 14:
             print("❌ Downloaded data is empty or too small")
             return None
 
-        header = fit_data[:14]
+        with open(dest_path, "rb") as f:
+            header = f.read(14)
         if b".FIT" in header or header[8:12] == b".FIT":
             print("✅ Downloaded data appears to be a valid FIT file")
         else:
             print("⚠️ Downloaded data may not be a FIT file")
             print(f"Header: {header}")
-        return fit_data
+        return dest_path
 
     except Exception as e:  # pylint: disable=broad-except
         print(f"❌ Test failed: {e}")
@@ -190,7 +512,9 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         test_activity_id = sys.argv[1]
         print(f"Testing download for activity ID: {test_activity_id}")
-        test_download(test_activity_id)
+        saved_path = test_download(test_activity_id)
+        if saved_path:
+            print(f"Saved to {saved_path}")
     else:
         print("Usage: python garmin.py <activity_id>")
         print("This will test the download functionality with the provided activity ID")
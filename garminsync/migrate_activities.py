@@ -3,14 +3,14 @@
 Migration script to populate activity fields from FIT files or Garmin API
 """
 
+import asyncio
 import os
 import sys
 from datetime import datetime
 import logging
 
-from sqlalchemy import MetaData, Table, create_engine, text
-from sqlalchemy.exc import OperationalError
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
 
 # Configure logging
 logging.basicConfig(
@@ -22,10 +22,16 @@ logger = logging.getLogger(__name__)
 # Add parent directory to path to import garminsync modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from garminsync.database import Activity, get_session, init_db
+from garminsync.database import (COMMIT_BATCH_SIZE, Activity,
+                                 flush_activity_updates, get_session, init_db,
+                                 metric_columns)
 from garminsync.garmin import GarminClient
 from garminsync.activity_parser import get_activity_metrics
 
+# Activities fetched concurrently, and how many are fetched per round
+MIGRATE_CONCURRENCY = int(os.getenv("MIGRATE_CONCURRENCY", "4"))
+MIGRATE_BATCH_SIZE = 32
+
 def migrate_activities():
     """Migrate activities to populate fields from FIT files or Garmin API"""
     logger.info("Starting activity migration...")
@@ -46,8 +52,12 @@ def migrate_activities():
     session = get_session()
 
     try:
-        # Get all activities that need to be updated (those with NULL activity_type)
-        activities = session.query(Activity).filter(Activity.activity_type.is_(None)).all()
+        # Get all activities that need to be updated (those with NULL activity_type);
+        # only the columns get_activity_metrics reads
+        activities = session.execute(
+            select(Activity.activity_id, Activity.filename)
+            .where(Activity.activity_type.is_(None))
+        ).all()
         logger.info(f"Found {len(activities)} activities to migrate")
 
         # If no activities found, exit early
@@ -55,67 +65,9 @@ def migrate_activities():
             logger.info("No activities found for migration")
             return True
 
-        updated_count = 0
-        error_count = 0
-
-        for i, activity in enumerate(activities):
-            try:
-                logger.info(f"Processing activity {i+1}/{len(activities)} (ID: {activity.activity_id})")
-
-                # Use shared parser to get activity metrics
-                activity_details = get_activity_metrics(activity, client)
-                
-                # Update activity fields if we have details
-                if activity_details:
-                    logger.info(f"Successfully parsed metrics for activity {activity.activity_id}")
-                    
-                    # Update activity fields
-                    activity.activity_type = activity_details.get("activityType", {}).get("typeKey", "Unknown")
-                    
-                    # Extract duration in seconds
-                    duration = activity_details.get("summaryDTO", {}).get("duration")
-                    if duration is not None:
-                        activity.duration = int(float(duration))
-                    
-                    # Extract distance in meters
-                    distance = activity_details.get("summaryDTO", {}).get("distance")
-                    if distance is not None:
-                        activity.distance = float(distance)
-                    
-                    # Extract max heart rate
-                    max_hr = activity_details.get("summaryDTO", {}).get("maxHR")
-                    if max_hr is not None:
-                        activity.max_heart_rate = int(float(max_hr))
-                    
-                    # Extract average power
-                    avg_power = activity_details.get("summaryDTO", {}).get("avgPower")
-                    if avg_power is not None:
-                        activity.avg_power = float(avg_power)
-                    
-                    # Extract calories
-                    calories = activity_details.get("summaryDTO", {}).get("calories")
-                    if calories is not None:
-                        activity.calories = int(float(calories))
-                else:
-                    # Set default values if we can't get details
-                    activity.activity_type = "Unknown"
-                    logger.warning(f"Could not retrieve metrics for activity {activity.activity_id}")
-
-                # Update last sync timestamp
-                activity.last_sync = datetime.now().isoformat()
-
-                session.commit()
-                updated_count += 1
-
-                # Log progress every 10 activities
-                if (i + 1) % 10 == 0:
-                    logger.info(f"Progress: {i+1}/{len(activities)} activities processed")
-
-            except Exception as e:
-                logger.error(f"Error processing activity {activity.activity_id}: {e}")
-                session.rollback()
-                error_count += 1
-                continue
+        updated_count, error_count = asyncio.run(
+            _migrate_batches(session, client, activities)
+        )
 
         logger.info(f"Migration completed. Updated: {updated_count}, Errors: {error_count}")
         return updated_count > 0 or error_count == 0  # Success if we updated any or had no errors
@@ -126,6 +78,72 @@ def migrate_activities():
     finally:
         session.close()
 
+
+async def _fetch_metrics(activities, client):
+    """Fetch metrics for a batch, up to MIGRATE_CONCURRENCY at a time
+
+    get_activity_metrics blocks on file parsing or the Garmin API, so each
+    call runs in a worker thread; failures are returned, not raised.
+    """
+    semaphore = asyncio.Semaphore(MIGRATE_CONCURRENCY)
+
+    async def fetch(activity):
+        async with semaphore:
+            return await asyncio.to_thread(get_activity_metrics, activity, client)
+
+    return await asyncio.gather(
+        *(fetch(activity) for activity in activities), return_exceptions=True
+    )
+
+
+async def _migrate_batches(session, client, activities):
+    """Update activities in batches; rows are written with one bulk UPDATE and
+    commit per COMMIT_BATCH_SIZE activities
+
+    Returns (updated_count, error_count).
+    """
+    updated_count = 0
+    error_count = 0
+    pending = []
+
+    def flush_pending():
+        nonlocal updated_count, error_count
+        written = len(pending)
+        try:
+            flush_activity_updates(session, pending)
+            updated_count += written
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to save batch: {e}")
+            error_count += written
+
+    for start in range(0, len(activities), MIGRATE_BATCH_SIZE):
+        batch = activities[start:start + MIGRATE_BATCH_SIZE]
+        results = await _fetch_metrics(batch, client)
+        now = datetime.now().isoformat()
+
+        for activity, activity_details in zip(batch, results):
+            if isinstance(activity_details, Exception):
+                logger.error(f"Error processing activity {activity.activity_id}: {activity_details}")
+                error_count += 1
+                continue
+
+            if activity_details:
+                # Update activity fields from the summary in one pass
+                columns = metric_columns(activity_details)
+            else:
+                # Set default values if we can't get details
+                columns = {}
+                logger.warning(f"Could not retrieve metrics for activity {activity.activity_id}")
+            columns.setdefault("activity_type", "Unknown")
+            pending.append({"activity_id": activity.activity_id, "last_sync": now, **columns})
+
+        if len(pending) >= COMMIT_BATCH_SIZE:
+            flush_pending()
+        logger.info(f"Progress: {start + len(batch)}/{len(activities)} activities processed")
+
+    flush_pending()
+    return updated_count, error_count
+
 if __name__ == "__main__":
     success = migrate_activities()
     sys.exit(0 if success else 1)
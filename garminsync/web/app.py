@@ -1,14 +1,25 @@
+import importlib.util
 import os
 from pathlib import Path
 
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 
-from .routes import router
+from .routes import STATS_CACHE_TTL, cached_offline_stats, router
 
-app = FastAPI(title="GarminSync Dashboard")
+# orjson serialises the API's dict responses in C; fall back to the stdlib
+# encoder when it is not installed
+if importlib.util.find_spec("orjson") is not None:
+    _default_response_class = ORJSONResponse
+else:
+    _default_response_class = JSONResponse
+
+app = FastAPI(
+    title="GarminSync Dashboard", default_response_class=_default_response_class
+)
 
 # Get the current directory path
 current_dir = Path(__file__).parent
@@ -21,7 +32,17 @@ if static_dir.exists():
     app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
 if templates_dir.exists():
-    templates = Jinja2Templates(directory=str(templates_dir))
+    # Templates only change on deploy: skip the per-render mtime check and
+    # keep compiled bytecode across restarts
+    templates = Jinja2Templates(
+        env=Environment(
+            loader=FileSystemLoader(str(templates_dir)),
+            autoescape=True,
+            auto_reload=False,
+            cache_size=400,
+            bytecode_cache=FileSystemBytecodeCache(),
+        )
+    )
 else:
     templates = None
 
@@ -29,14 +50,24 @@ else:
 app.include_router(router)
 
 
+@app.on_event("shutdown")
+async def close_database():
+    """Release the async engine used by the API routes"""
+    from garminsync.database import close_async_db
+
+    await close_async_db()
+
+
+# Rendered dashboard shell, built on first request
+_dashboard_html = None
+
+
 @app.get("/")
 async def dashboard(request: Request):
     """Dashboard route with fallback for missing templates"""
     if not templates:
         # Return JSON response if templates are not available
-        from garminsync.database import get_offline_stats
-
-        stats = get_offline_stats()
+        stats = cached_offline_stats()
         return JSONResponse(
             {
                 "message": "GarminSync Dashboard",
@@ -46,13 +77,15 @@ async def dashboard(request: Request):
         )
 
     try:
-        # Get current statistics
-        from garminsync.database import get_offline_stats
-
-        stats = get_offline_stats()
-
-        return templates.TemplateResponse(
-            "dashboard.html", {"request": request, "stats": stats}
+        # The page is a static shell (home.js fetches /api/dashboard/stats),
+        # so it is rendered once and the same HTML is served afterwards
+        global _dashboard_html
+        if _dashboard_html is None:
+            _dashboard_html = templates.get_template("dashboard.html").render()
+
+        return HTMLResponse(
+            _dashboard_html,
+            headers={"Cache-Control": f"public, max-age={STATS_CACHE_TTL}"},
         )
     except Exception as e:
         return JSONResponse(
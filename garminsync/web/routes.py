@@ -1,12 +1,56 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from pydantic import BaseModel
-
-from garminsync.database import Activity, DaemonConfig, SyncLog, get_session
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from garminsync.activity_parser import (get_activity_metrics_async,
+                                        get_parse_executor)
+from garminsync.daemon import get_daemon
+from garminsync.database import (Activity, DaemonConfig, SyncLog,
+                                 flush_activity_updates, get_db,
+                                 get_db_session, get_offline_stats, get_session,
+                                 iter_missing_activities, metric_columns,
+                                 sync_database)
+from garminsync.garmin import GarminClient, download_activities
+from garminsync.utils import DATA_DIR, activity_filename, logger
 
 router = APIRouter(prefix="/api")
 
+# Stats are reused for a few seconds so polling clients don't hit SQLite
+STATS_CACHE_TTL = 5
+_stats_cache = {"ts": 0.0, "val": None}
+
+
+def cached_offline_stats():
+    """Return get_offline_stats(), recomputed at most every STATS_CACHE_TTL seconds"""
+    now = time.monotonic()
+    if _stats_cache["val"] is None or now - _stats_cache["ts"] > STATS_CACHE_TTL:
+        _stats_cache.update(ts=now, val=get_offline_stats())
+    return _stats_cache["val"]
+
+
+def invalidate_stats_cache():
+    """Drop cached stats so the next request sees a sync's results"""
+    _stats_cache["val"] = None
+
+
+# SyncLog has no relationships; the log endpoints read these columns as plain
+# rows, skipping ORM object construction and identity-map bookkeeping
+_LOG_COLUMNS = (
+    SyncLog.timestamp,
+    SyncLog.operation,
+    SyncLog.status,
+    SyncLog.message,
+    SyncLog.activities_processed,
+    SyncLog.activities_downloaded,
+)
+
 
 class ScheduleConfig(BaseModel):
     enabled: bool
@@ -16,12 +60,15 @@ class ScheduleConfig(BaseModel):
 @router.get("/status")
 async def get_status():
     """Get current daemon status"""
-    session = get_session()
-    try:
-        config = session.query(DaemonConfig).first()
+    # Async session: the event loop keeps serving other requests while
+    # these queries run
+    async with get_db() as session:
+        config = (await session.execute(select(DaemonConfig).limit(1))).scalars().first()
 
         # Get recent logs
-        logs = session.query(SyncLog).order_by(SyncLog.timestamp.desc()).limit(10).all()
+        logs = await session.execute(
+            select(*_LOG_COLUMNS).order_by(SyncLog.timestamp.desc()).limit(10)
+        )
 
         # Convert to dictionaries to avoid session issues
         daemon_data = {
@@ -32,113 +79,142 @@ async def get_status():
             "enabled": config.enabled if config else False,
         }
 
-        log_data = []
-        for log in logs:
-            log_data.append(
-                {
-                    "timestamp": log.timestamp,
-                    "operation": log.operation,
-                    "status": log.status,
-                    "message": log.message,
-                    "activities_processed": log.activities_processed,
-                    "activities_downloaded": log.activities_downloaded,
-                }
-            )
+        log_data = [dict(log) for log in logs.mappings()]
 
-        return {"daemon": daemon_data, "recent_logs": log_data}
-    finally:
-        session.close()
+    return {"daemon": daemon_data, "recent_logs": log_data}
 
 
 @router.post("/schedule")
 async def update_schedule(config: ScheduleConfig):
     """Update daemon schedule configuration"""
-    session = get_session()
     try:
-        daemon_config = session.query(DaemonConfig).first()
+        # get_db commits on exit and discards the changes on error
+        async with get_db() as session:
+            daemon_config = (
+                await session.execute(select(DaemonConfig).limit(1))
+            ).scalars().first()
 
-        if not daemon_config:
-            daemon_config = DaemonConfig()
-            session.add(daemon_config)
+            if not daemon_config:
+                daemon_config = DaemonConfig()
+                session.add(daemon_config)
 
-        daemon_config.enabled = config.enabled
-        daemon_config.schedule_cron = config.cron_schedule
-        session.commit()
+            daemon_config.enabled = config.enabled
+            daemon_config.schedule_cron = config.cron_schedule
 
         return {"message": "Configuration updated successfully"}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
     except Exception as e:
-        session.rollback()
         raise HTTPException(
             status_code=500, detail=f"Failed to update configuration: {str(e)}"
-        )
-    finally:
-        session.close()
+        ) from e
 
 
-@router.post("/sync/trigger")
-async def trigger_sync():
-    """Manually trigger a sync operation"""
-    try:
-        # Import here to avoid circular imports
-        import os
-        from datetime import datetime
-        from pathlib import Path
+# Set while a manual sync runs in the background
+_manual_sync_running = threading.Event()
+# Garmin client reused across manual syncs, as the daemon does, so its login
+# and HTTP connection pool survive between presses of "Sync Now"
+_garmin_client = None
 
-        from garminsync.database import Activity, sync_database
-        from garminsync.garmin import GarminClient
 
-        # Create client and sync
-        client = GarminClient()
-        sync_database(client)
+def _get_garmin_client():
+    """Return the shared GarminClient, creating it on first use"""
+    global _garmin_client
+    if _garmin_client is None:
+        _garmin_client = GarminClient()
+    return _garmin_client
 
-        # Download missing activities
-        session = get_session()
-        try:
-            missing_activities = (
-                session.query(Activity).filter_by(downloaded=False).all()
-            )
-            downloaded_count = 0
 
-            data_dir = Path(os.getenv("DATA_DIR", "data"))
-            data_dir.mkdir(parents=True, exist_ok=True)
+def _download_missing(client):
+    """Download every missing activity and record it; returns the count
 
-            for activity in missing_activities:
-                try:
-                    fit_data = client.download_activity_fit(activity.activity_id)
+    Blocking SQLite and HTTP work, run in a worker thread by _run_manual_sync.
+    """
+    downloaded_count = 0
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    pending = []
 
-                    timestamp = activity.start_time.replace(":", "-").replace(" ", "_")
-                    filename = f"activity_{activity.activity_id}_{timestamp}.fit"
-                    filepath = data_dir / filename
+    def record_download(activity_id, filepath, error):
+        if error:
+            logger.error(f"Failed to download activity {activity_id}: {error}")
+            return
+        pending.append({
+            "activity_id": activity_id,
+            "filename": str(filepath),
+            "downloaded": True,
+            "last_sync": datetime.now().isoformat(),
+        })
+
+    session = get_session()
+    try:
+        for rows in iter_missing_activities(session):
+            jobs = [
+                (activity.activity_id, activity.activity_id,
+                 DATA_DIR / activity_filename(activity.activity_id, activity.start_time))
+                for activity in rows
+            ]
+            # Each chunk is fetched concurrently (CONCURRENT_DOWNLOADS at a
+            # time), then written in one UPDATE batch
+            download_activities(client, jobs, record_download)
+            downloaded_count += len(pending)
+            flush_activity_updates(session, pending)
+    finally:
+        session.close()
+    return downloaded_count
 
-                    with open(filepath, "wb") as f:
-                        f.write(fit_data)
 
-                    activity.filename = str(filepath)
-                    activity.downloaded = True
-                    activity.last_sync = datetime.now().isoformat()
-                    downloaded_count += 1
-                    session.commit()
+async def _run_manual_sync():
+    """Sync with Garmin and download missing activities after the response
 
-                except Exception as e:
-                    print(f"Failed to download activity {activity.activity_id}: {e}")
-                    session.rollback()
+    The outcome is recorded as a SyncLog entry, which clients see by polling
+    /api/logs or /api/status.
+    """
+    global _garmin_client
+    downloaded_count = 0
+    try:
+        # The blocking API calls and SQLite writes stay off the event loop
+        client = _get_garmin_client()
+        await asyncio.to_thread(sync_database, client)
+        downloaded_count = await asyncio.to_thread(_download_missing, client)
 
-            return {
-                "message": f"Sync completed successfully. Downloaded {downloaded_count} activities."
-            }
-        finally:
-            session.close()
+        status = "success"
+        message = f"Manual sync completed. Downloaded {downloaded_count} activities."
+    except Exception as e:
+        logger.error(f"Manual sync failed: {e}")
+        status, message = "error", f"Manual sync failed: {e}"
+        # Log in afresh next time in case the session itself went bad
+        _garmin_client = None
+    finally:
+        _manual_sync_running.clear()
+        invalidate_stats_cache()
 
+    try:
+        async with get_db() as session:
+            session.add(SyncLog(
+                timestamp=datetime.now().isoformat(),
+                operation="sync",
+                status=status,
+                message=message,
+                activities_downloaded=downloaded_count,
+            ))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Sync failed: {str(e)}")
+        logger.error(f"Failed to record manual sync: {e}")
+
+
+@router.post("/sync/trigger", status_code=202)
+async def trigger_sync(background_tasks: BackgroundTasks):
+    """Start a manual sync in the background and return immediately"""
+    if _manual_sync_running.is_set():
+        raise HTTPException(status_code=409, detail="A sync is already running")
+    _manual_sync_running.set()
+    background_tasks.add_task(_run_manual_sync)
+    return {"message": "Sync started"}
 
 
 @router.get("/activities/stats")
 async def get_activity_stats():
     """Get activity statistics"""
-    from garminsync.database import get_offline_stats
-
-    return get_offline_stats()
+    return cached_offline_stats()
 
 
 @router.get("/logs")
@@ -150,61 +226,56 @@ async def get_logs(
     per_page: int = 20,
 ):
     """Get sync logs with filtering and pagination"""
-    session = get_session()
-    try:
-        query = session.query(SyncLog)
+    async with get_db() as session:
+        filters = []
 
         # Apply filters
         if status:
-            query = query.filter(SyncLog.status == status)
+            filters.append(SyncLog.status == status)
         if operation:
-            query = query.filter(SyncLog.operation == operation)
+            filters.append(SyncLog.operation == operation)
         if date:
             # Filter by date (assuming ISO format)
-            query = query.filter(SyncLog.timestamp.like(f"{date}%"))
+            filters.append(SyncLog.timestamp.like(f"{date}%"))
 
         # Get total count for pagination
-        total = query.count()
+        total = await session.scalar(
+            select(func.count()).select_from(SyncLog).where(*filters)
+        )
 
         # Apply pagination
-        logs = (
-            query.order_by(SyncLog.timestamp.desc())
+        logs = await session.execute(
+            select(SyncLog.id, *_LOG_COLUMNS)
+            .where(*filters)
+            .order_by(SyncLog.timestamp.desc())
             .offset((page - 1) * per_page)
             .limit(per_page)
-            .all()
         )
 
-        log_data = []
-        for log in logs:
-            log_data.append(
-                {
-                    "id": log.id,
-                    "timestamp": log.timestamp,
-                    "operation": log.operation,
-                    "status": log.status,
-                    "message": log.message,
-                    "activities_processed": log.activities_processed,
-                    "activities_downloaded": log.activities_downloaded,
-                }
-            )
+        log_data = [dict(log) for log in logs.mappings()]
 
-        return {"logs": log_data, "total": total, "page": page, "per_page": per_page}
-    finally:
-        session.close()
+    return {"logs": log_data, "total": total, "page": page, "per_page": per_page}
+
+
+# Thread running the daemon's start() when launched from the web UI
+_daemon_thread = None
 
 
 @router.post("/daemon/start")
 async def start_daemon():
     """Start the daemon process"""
-    from garminsync.daemon import daemon_instance
+    global _daemon_thread
+    daemon = get_daemon()
 
-    try:
-        # Start the daemon in a separate thread to avoid blocking
-        import threading
+    # Repeated clicks must not start a second daemon alongside the first
+    if daemon.running or (_daemon_thread and _daemon_thread.is_alive()):
+        raise HTTPException(status_code=409, detail="Daemon is already running")
 
-        daemon_thread = threading.Thread(target=daemon_instance.start)
-        daemon_thread.daemon = True
-        daemon_thread.start()
+    try:
+        # Start the daemon in a separate thread; start() blocks until shutdown,
+        # so it can't run as a task on this event loop
+        _daemon_thread = threading.Thread(target=daemon.start, daemon=True)
+        _daemon_thread.start()
 
         # Update daemon status in database
         session = get_session()
@@ -226,18 +297,17 @@ async def start_daemon():
 @router.post("/daemon/stop")
 async def stop_daemon():
     """Stop the daemon process"""
-    from garminsync.daemon import daemon_instance
-
     try:
-        # Stop the daemon
-        daemon_instance.stop()
+        # Stop the daemon, if this process ever built one
+        daemon = get_daemon(create=False)
+        if daemon is not None:
+            daemon.stop()
 
-        # Update daemon status in database
+        # Update daemon status in database with a single UPDATE; the
+        # config row never needs loading
         session = get_session()
-        config = session.query(DaemonConfig).first()
-        if config:
-            config.status = "stopped"
-            session.commit()
+        session.execute(update(DaemonConfig).values(status="stopped"))
+        session.commit()
 
         return {"message": "Daemon stopped successfully"}
     except Exception as e:
@@ -250,39 +320,31 @@ async def stop_daemon():
 @router.delete("/logs")
 async def clear_logs():
     """Clear all sync logs"""
-    session = get_session()
     try:
-        session.query(SyncLog).delete()
-        session.commit()
+        async with get_db() as session:
+            # One DELETE FROM; no session objects need syncing with it
+            await session.execute(
+                delete(SyncLog).execution_options(synchronize_session=False)
+            )
         return {"message": "Logs cleared successfully"}
     except Exception as e:
-        session.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to clear logs: {str(e)}")
-    finally:
-        session.close()
 
 @router.post("/activities/{activity_id}/reprocess")
 async def reprocess_activity(activity_id: int):
     """Reprocess a single activity to update metrics"""
-    from garminsync.database import Activity, get_session
-    from garminsync.activity_parser import get_activity_metrics
-    
     session = get_session()
     try:
-        activity = session.query(Activity).get(activity_id)
+        activity = session.get(Activity, activity_id)
         if not activity:
             raise HTTPException(status_code=404, detail="Activity not found")
             
-        metrics = get_activity_metrics(activity, force_reprocess=True)
+        # Parse in the shared process pool so the event loop keeps serving requests
+        metrics = await get_activity_metrics_async(activity, executor=get_parse_executor())
         if metrics:
-            # Update activity metrics
-            activity.activity_type = metrics.get("activityType", {}).get("typeKey")
-            activity.duration = int(float(metrics.get("duration", 0))) if metrics.get("duration") else activity.duration
-            activity.distance = float(metrics.get("distance", 0)) if metrics.get("distance") else activity.distance
-            activity.max_heart_rate = int(float(metrics.get("maxHR", 0))) if metrics.get("maxHR") else activity.max_heart_rate
-            activity.avg_heart_rate = int(float(metrics.get("avgHR", 0))) if metrics.get("avgHR") else activity.avg_heart_rate
-            activity.avg_power = float(metrics.get("avgPower", 0)) if metrics.get("avgPower") else activity.avg_power
-            activity.calories = int(float(metrics.get("calories", 0))) if metrics.get("calories") else activity.calories
+            # Update activity metrics, keeping stored values for missing ones
+            for attr, value in metric_columns(metrics).items():
+                setattr(activity, attr, value)
         
         # Mark as reprocessed
         activity.reprocessed = True
@@ -297,11 +359,9 @@ async def reprocess_activity(activity_id: int):
 @router.post("/reprocess")
 async def reprocess_activities(all: bool = False):
     """Reprocess all activities or just missing ones"""
-    from garminsync.daemon import daemon_instance
-    
     try:
         # Trigger reprocess job in daemon
-        daemon_instance.reprocess_activities()
+        get_daemon().reprocess_activities()
         return {"message": "Reprocess job started in background"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to start reprocess job: {str(e)}")
@@ -374,9 +434,7 @@ async def get_activity_details(activity_id: int):
     """Get detailed activity information"""
     session = get_session()
     try:
-        activity = (
-            session.query(Activity).filter(Activity.activity_id == activity_id).first()
-        )
+        activity = session.get(Activity, activity_id)
         if not activity:
             raise HTTPException(
                 status_code=404, detail=f"Activity with ID {activity_id} not found"
@@ -404,71 +462,43 @@ async def get_activity_details(activity_id: int):
 @router.get("/dashboard/stats")
 async def get_dashboard_stats():
     """Get comprehensive dashboard statistics"""
-    from garminsync.database import get_offline_stats
-
-    return get_offline_stats()
+    return cached_offline_stats()
 
 
 @router.get("/api/activities")
-async def get_api_activities(page: int = 1, per_page: int = 10):
-    """Get paginated activities for API"""
-    session = get_session()
-    try:
-        # Use the existing get_paginated method from Activity class
-        pagination = Activity.get_paginated(page, per_page)
-        activities = pagination.items
-        total_pages = pagination.pages
-        current_page = pagination.page
-        total_items = pagination.total
-
-        if not activities and page > 1:
-            raise HTTPException(
-                status_code=404, detail=f"No activities found for page {page}"
-            )
-
-        if not activities and page == 1 and total_items == 0:
-            raise HTTPException(status_code=404, detail="No activities found")
-
-        if not activities:
-            raise HTTPException(status_code=404, detail="No activities found")
+async def get_api_activities(
+    page: int = 1,
+    per_page: int = 10,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db_session),
+):
+    """Get paginated activities for API
 
-        return {
-            "activities": [
-                {
-                    "id": activity.activity_id,
-                    "name": activity.filename or "Unnamed Activity",
-                    "distance": activity.distance,
-                    "duration": activity.duration,
-                    "start_time": activity.start_time,
-                    "activity_type": activity.activity_type,
-                    "max_heart_rate": activity.max_heart_rate,
-                    "avg_power": activity.avg_power,
-                    "calories": activity.calories,
-                    "downloaded": activity.downloaded,
-                    "created_at": activity.created_at,
-                    "last_sync": activity.last_sync,
-                    "device": activity.device or "Unknown",
-                    "intensity": activity.intensity or "Unknown",
-                    "average_speed": activity.average_speed,
-                    "elevation_gain": activity.elevation_gain,
-                    "heart_rate_zones": activity.heart_rate_zones or [],
-                    "power_zones": activity.power_zones or [],
-                    "training_effect": activity.training_effect or 0,
-                    "training_effect_label": activity.training_effect_label
-                    or "Unknown",
-                }
-                for activity in activities
-            ],
-            "total_pages": total_pages,
-            "current_page": current_page,
-            "total_items": total_items,
-            "page_size": per_page,
-            "status": "success",
-        }
+    Pass the previous response's next_cursor as cursor to read the following
+    page by keyset instead of by page number.
+    """
+    try:
+        pagination = await Activity.get_paginated(db, page, per_page, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}") from e
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"An error occurred while fetching activities: {str(e)}",
-        )
-    finally:
-        session.close()
+        ) from e
+
+    activities = pagination["items"]
+    if not activities:
+        detail = f"No activities found for page {page}" if page > 1 else "No activities found"
+        raise HTTPException(status_code=404, detail=detail)
+
+    # Items are already plain dicts from Activity.to_dict()
+    return {
+        "activities": activities,
+        "total_pages": pagination["pages"],
+        "current_page": pagination["page"],
+        "total_items": pagination["total"],
+        "page_size": per_page,
+        "next_cursor": pagination["next_cursor"],
+        "status": "success",
+    }
@@ -34,9 +34,10 @@ class HomePage {
             const result = await response.json();
             
             if (response.ok) {
-                status.textContent = 'Sync completed successfully';
+                // The sync runs in the background; progress shows up in the logs
+                status.textContent = result.message || 'Sync started';
                 status.className = 'sync-status success';
-                this.updateStats();
+                this.updateLogs();
             } else {
                 throw new Error(result.detail || 'Sync failed');
             }
@@ -133,8 +134,8 @@ class HomePage {
     }
     
     async loadInitialData() {
-        // Load initial logs
-        await this.updateLogs();
+        // The page is served without stats; fill them in alongside the logs
+        await Promise.all([this.updateStats(), this.updateLogs()]);
     }
 }
 
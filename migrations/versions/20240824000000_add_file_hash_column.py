@@ -0,0 +1,23 @@
+"""Add file_hash column
+
+Revision ID: 20240824000000
+Revises: 20240823000000
+Create Date: 2025-08-24 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20240824000000'
+down_revision = '20240823000000'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Content hash of the file as of the last successful parse
+    op.add_column('activities', sa.Column('file_hash', sa.String(), nullable=True))
+
+def downgrade():
+    with op.batch_alter_table('activities') as batch_op:
+        batch_op.drop_column('file_hash')
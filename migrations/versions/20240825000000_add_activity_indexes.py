@@ -0,0 +1,22 @@
+"""Add indexes on activities (downloaded, activity_id) and last_sync
+
+Revision ID: 20240825000000
+Revises: 20240824000000
+Create Date: 2025-08-25 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20240825000000'
+down_revision = '20240824000000'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('ix_act_dl_id', 'activities', ['downloaded', 'activity_id'])
+    op.create_index('ix_activities_last_sync', 'activities', ['last_sync'])
+
+def downgrade():
+    op.drop_index('ix_activities_last_sync', table_name='activities')
+    op.drop_index('ix_act_dl_id', table_name='activities')
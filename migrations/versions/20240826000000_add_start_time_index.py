@@ -0,0 +1,20 @@
+"""Add index on activities.start_time
+
+Revision ID: 20240826000000
+Revises: 20240825000000
+Create Date: 2025-08-26 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20240826000000'
+down_revision = '20240825000000'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('ix_activities_start_time', 'activities', ['start_time'])
+
+def downgrade():
+    op.drop_index('ix_activities_start_time', table_name='activities')
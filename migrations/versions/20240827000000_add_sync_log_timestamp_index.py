@@ -0,0 +1,20 @@
+"""Add index on sync_logs.timestamp
+
+Revision ID: 20240827000000
+Revises: 20240826000000
+Create Date: 2025-08-27 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20240827000000'
+down_revision = '20240826000000'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('ix_sync_logs_timestamp', 'sync_logs', ['timestamp'])
+
+def downgrade():
+    op.drop_index('ix_sync_logs_timestamp', table_name='sync_logs')
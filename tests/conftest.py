@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Make the project root importable once per session, wherever it is checked out
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture(scope="session")
+def db_module():
+    """garminsync.database, imported on first use rather than at collection"""
+    from garminsync import database
+
+    return database
+
+
+@pytest.fixture(scope="session")
+def sync_db(db_module):
+    """The sync_database function under test"""
+    return db_module.sync_database
@@ -0,0 +1,71 @@
+from contextlib import nullcontext
+
+import pytest
+
+from garminsync import _parse_cache, activity_parser
+from garminsync.activity_parser import parse_activity_summary, parse_fit_file
+
+
+class _Frame:
+    """Minimal fitdecode data frame"""
+
+    def __init__(self, name, **values):
+        import fitdecode
+        self.frame_type = fitdecode.FIT_FRAME_DATA
+        self.name = name
+        self.values = values
+
+    def get_value(self, key, fallback=None, raw_value=False):
+        return self.values.get(key, fallback)
+
+
+@pytest.fixture
+def parse_cache(tmp_path, monkeypatch):
+    """Point the on-disk parse cache at a throwaway directory"""
+    monkeypatch.setattr(_parse_cache, "CACHE_DIR", str(tmp_path / "parse"))
+    monkeypatch.setattr(_parse_cache, "_cache", None)
+    return tmp_path
+
+@pytest.mark.parametrize("file_path", [None, ""])
+def test_parse_activity_summary_without_file(parse_cache, file_path):
+    """Activities that were never downloaded have no filename to parse"""
+    assert parse_activity_summary(file_path) is None
+
+def test_parse_activity_summary_missing_file(parse_cache):
+    """A filename whose file is gone parses to None and is not cached"""
+    missing = str(parse_cache / "missing.fit")
+    assert parse_activity_summary(missing) is None
+    assert parse_activity_summary(missing) is None
+
+def test_cached_parse_skips_falsy_path(parse_cache):
+    """A falsy path goes straight to the parser without touching the cache"""
+    calls = []
+
+    def parse(file_path):
+        calls.append(file_path)
+        return {"distance": 1.0}
+
+    assert _parse_cache.cached_parse(None, parse) == {"distance": 1.0}
+    assert calls == [None]
+    assert _parse_cache._cache is None
+
+def test_parse_fit_file_with_record_missing_altitude(monkeypatch):
+    """A cycling record without altitude leaves the channels unequal in length;
+    gear analysis runs over their common prefix instead of failing the parse"""
+    records = [
+        _Frame("record", timestamp=1000 + i, speed=8.0, cadence=90,
+               altitude=100.0 + i * 0.1, power=200)
+        for i in range(10)
+    ]
+    # Last sample has speed and cadence but no altitude
+    records.append(_Frame("record", timestamp=1010, speed=8.0, cadence=90, power=200))
+    frames = records + [_Frame("session", sport="cycling", total_timer_time=11.0)]
+    monkeypatch.setattr(activity_parser, "_fit_reader", lambda path: nullcontext(frames))
+
+    result = parse_fit_file("ride.fit", file_type="fit")
+
+    assert result is not None
+    detailed = result["detailedMetrics"]
+    assert detailed["speeds"].size == 11
+    assert detailed["gradients"].size == 10
+    assert result["summaryDTO"]["gearAnalysis"]["estimated_chainring_teeth"] in (38, 46)
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from garminsync.database import Activity, Base, invalidate_page_cache
+
+
+def _activities(start_times):
+    """Activity rows with ids 1..n and the given start times"""
+    return [
+        Activity(activity_id=i, start_time=start_time, created_at="2024-01-01T00:00:00")
+        for i, start_time in enumerate(start_times, 1)
+    ]
+
+async def _walk(db_path, start_times, per_page):
+    """Pages of (start_time, activity_id) from following next_cursor, and the
+    same pages read by page number"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        async with sessions.begin() as session:
+            session.add_all(_activities(start_times))
+        db = sessions()
+
+        def key(result):
+            return [(a["start_time"], a["id"]) for a in result["items"]]
+
+        by_cursor, cursor = [], None
+        while True:
+            result = await Activity.get_paginated(db, per_page=per_page, cursor=cursor)
+            by_cursor.append(key(result))
+            cursor = result["next_cursor"]
+            if cursor is None:
+                break
+        by_page = [
+            key(await Activity.get_paginated(db, page=page, per_page=per_page))
+            for page in range(1, result["pages"] + 1)
+        ]
+        await db.close()
+        return by_cursor, by_page
+    finally:
+        await engine.dispose()
+
+@pytest.fixture
+def walk(tmp_path):
+    """Run _walk against a fresh database, with the page cache cleared"""
+    invalidate_page_cache()
+    yield lambda start_times, per_page: asyncio.run(
+        _walk(tmp_path / "activities.db", start_times, per_page)
+    )
+    invalidate_page_cache()
+
+@pytest.mark.parametrize("start_times, per_page", [
+    # Equal start times straddle page boundaries; activity_id orders them
+    pytest.param(["2024-01-01T10:00:00"] * 7, 3, id="equal-start-time"),
+    pytest.param([f"2024-01-{d:02d}T10:00:00" for d in (3, 1, 2, 2, 5, 4)], 2,
+                 id="exact-multiple"),
+    pytest.param(["2024-01-01T10:00:00", "2024-01-02T10:00:00"], 5, id="single-page"),
+])
+def test_keyset_pages_match_offset_pages(walk, start_times, per_page):
+    """Test following next_cursor returns the same rows as numbered pages"""
+    by_cursor, by_page = walk(start_times, per_page)
+    assert by_cursor == by_page
+    rows = [row for page in by_cursor for row in page]
+    assert rows == sorted(
+        ((t, i) for i, t in enumerate(start_times, 1)), reverse=True
+    )
+    # The last page ends the walk; no empty page is fetched after it
+    assert all(by_cursor)
+
+def test_keyset_empty_table(walk):
+    """Test an empty table gives one empty page and no cursor"""
+    by_cursor, by_page = walk([], 10)
+    assert by_cursor == [[]]
+    assert by_page == []
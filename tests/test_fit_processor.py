@@ -0,0 +1,133 @@
+import math
+
+import numpy as np
+import pytest
+
+from garminsync.fit_processor import power_estimator
+from garminsync.fit_processor.gear_analyzer import SinglespeedAnalyzer
+from garminsync.fit_processor.power_estimator import PowerEstimator, air_density
+
+
+def _scalar_power(est, speed_ms, gradient_percent, air_temp_c=20, altitude_m=0):
+    """calculate_power as first written, before the math/air-density rework"""
+    temp_k = air_temp_c + 273.15
+    pressure = 101325 * (1 - 0.0000225577 * altitude_m) ** 5.25588
+    rho = pressure / (287.05 * temp_k)
+    gradient_rad = np.arctan(gradient_percent / 100.0)
+    total_mass = est.bike_weight_kg + est.rider_weight_kg
+    p_roll = est.rolling_resistance * total_mass * 9.81 * np.cos(gradient_rad) * speed_ms
+    p_grav = total_mass * 9.81 * np.sin(gradient_rad) * speed_ms
+    p_aero = 0.5 * rho * est.drag_coefficient * est.frontal_area_m2 * speed_ms ** 3
+    return (p_roll + p_grav + p_aero) / est.drivetrain_efficiency
+
+def _loop_peak_power(power, durations):
+    """Best mean power per duration by checking every window"""
+    return {
+        d: max(sum(power[i:i + d]) / d for i in range(len(power) - d + 1))
+        for d in durations if 0 < d <= len(power)
+    }
+
+def _loop_gear_fit(analyzer, avg_gear_ratio):
+    """The chainring-then-cog search SinglespeedAnalyzer started with"""
+    best_fit, min_diff = None, float("inf")
+    for chainring in analyzer.chainring_options:
+        for cog in analyzer.common_cogs:
+            diff = abs(chainring / cog - avg_gear_ratio)
+            if diff < min_diff:
+                min_diff, best_fit = diff, (chainring, cog)
+    return best_fit
+
+@pytest.fixture
+def estimator():
+    return PowerEstimator()
+
+@pytest.mark.parametrize("speed, gradient, temp, altitude", [
+    (0, 0, 20, 0),
+    (8.3, 0, 20, 0),
+    (5.0, 7.5, 12, 850),
+    (12.0, -4.0, 30, 2000),
+    (3, 15, -5, 0),
+])
+def test_calculate_power_matches_scalar_formula(estimator, speed, gradient, temp, altitude):
+    """Test calculate_power, _fast and _batch agree with the original formula"""
+    expected = _scalar_power(estimator, speed, gradient, temp, altitude)
+    assert estimator.calculate_power(speed, gradient, temp, altitude) == pytest.approx(expected)
+    assert estimator.calculate_power_fast(
+        speed, gradient, air_density(temp, altitude)
+    ) == pytest.approx(expected)
+    batch = estimator.calculate_power_batch([speed], [gradient], temp, altitude)
+    assert batch[0] == pytest.approx(expected)
+
+def test_calculate_power_still_validates(estimator):
+    """Test the validated entry point rejects what calculate_power_fast accepts"""
+    with pytest.raises(ValueError):
+        estimator.calculate_power(-1.0, 0)
+    with pytest.raises(ValueError):
+        estimator.calculate_power(5.0, "steep")
+
+@pytest.mark.parametrize("power, durations", [
+    pytest.param(list(np.random.default_rng(1).uniform(0, 400, 300)), [1, 5, 30, 60, 300],
+                 id="random"),
+    # Every window of a flat ride ties; the mean is still the answer
+    pytest.param([250.0] * 20, [1, 7, 20], id="ties"),
+    pytest.param([100.0, 500.0, 100.0], [1, 2, 3], id="window-equals-ride"),
+])
+def test_estimate_peak_power_matches_loop(estimator, power, durations):
+    """Test estimate_peak_power against a window-by-window search"""
+    peaks = estimator.estimate_peak_power(power, durations)
+    expected = _loop_peak_power(power, durations)
+    assert peaks.keys() == expected.keys()
+    for d, value in expected.items():
+        assert peaks[d] == pytest.approx(value)
+
+def test_estimate_peak_power_edge_cases(estimator):
+    """Test windows longer than the ride, non-positive and repeated durations"""
+    power = [100.0, 200.0, 300.0]
+    assert estimator.estimate_peak_power(power, [4, 60]) == {}
+    assert estimator.estimate_peak_power(power, [0, -5, 2, 2]) == {2: 250.0}
+    assert estimator.estimate_peak_power([], [1, 5]) == {}
+
+@pytest.mark.skipif(not power_estimator.HAS_NUMBA, reason="numba not installed")
+def test_estimate_peak_power_numba_matches_numpy(estimator, monkeypatch):
+    """Test the Numba kernel returns the NumPy path's peaks"""
+    power = np.random.default_rng(2).uniform(0, 600, 2000)
+    durations = [1, 5, 60, 2000, 2001]
+    expected = estimator.estimate_peak_power(power, durations)
+    monkeypatch.setattr(power_estimator, "NUMBA_MIN_SAMPLES", 0)
+    peaks = estimator.estimate_peak_power(power, durations)
+    assert peaks.keys() == expected.keys()
+    for d, value in expected.items():
+        assert peaks[d] == pytest.approx(value)
+
+def test_gear_ratio_matches_nested_loop():
+    """Test the binary search picks the nested loop's gear across the ratio range"""
+    analyzer = SinglespeedAnalyzer()
+    speed = 10.0
+    # Includes ratios below the smallest and above the largest combination
+    for target in np.linspace(0.5, 5.0, 451):
+        cadence = speed * 60 / (target * analyzer.wheel_circumference_m)
+        result = analyzer.analyze_gear_ratio([speed], [cadence], [0.0])
+        avg = speed * 60 / (cadence * analyzer.wheel_circumference_m)
+        expected = _loop_gear_fit(analyzer, avg)
+        assert (result["estimated_chainring_teeth"],
+                result["estimated_cassette_teeth"]) == expected
+        ratio = expected[0] / expected[1]
+        assert result["confidence_score"] == pytest.approx(
+            max(0, 1 - abs(ratio - avg) / ratio)
+        )
+
+def test_gear_ratio_tie_takes_first_combination():
+    """Test 38x19 wins over the identical 46x23 ratio, as in the loop"""
+    analyzer = SinglespeedAnalyzer()
+    cadence = 90.0
+    speed = 2.0 * cadence * analyzer.wheel_circumference_m / 60
+    result = analyzer.analyze_gear_ratio([speed], [cadence], [1.0])
+    assert (result["estimated_chainring_teeth"], result["estimated_cassette_teeth"]) == (38, 19)
+    assert math.isclose(result["gear_ratio"], 2.0)
+
+def test_gear_ratio_without_usable_samples():
+    """Test steep, slow or zero-cadence samples give no estimate"""
+    analyzer = SinglespeedAnalyzer()
+    assert analyzer.analyze_gear_ratio([10.0, 2.0, 10.0], [90, 90, 0], [5.0, 0.0, 0.0]) is None
+    with pytest.raises(ValueError):
+        analyzer.analyze_gear_ratio([], [], [])
@@ -0,0 +1,150 @@
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+
+try:
+    import garminconnect  # noqa: F401
+except Exception as e:  # missing, or failing on import with this pydantic
+    pytest.skip(f"garminconnect unavailable: {e}", allow_module_level=True)
+
+from garminsync import garmin  # noqa: E402
+
+
+class _FakeClock:
+    """Stands in for the time module; sleeping just advances the clock"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class _HTTPError(Exception):
+    """An HTTP error carrying a requests-style response"""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.response = SimpleNamespace(status_code=status_code)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _FakeClock()
+    monkeypatch.setattr(garmin, "time", clock)
+    return clock
+
+@pytest.fixture
+def limiter(clock, monkeypatch):
+    """A fresh shared limiter: one call per second, bursts of three"""
+    limiter = garmin._RateLimiter(rate=1.0, capacity=3, max_interval=4.0)
+    monkeypatch.setattr(garmin, "_rate_limiter", limiter)
+    return limiter
+
+def test_rate_limiter_bursts_then_paces(clock, limiter):
+    """Test the bucket lets a burst through, then spaces calls at the rate"""
+    for _ in range(5):
+        limiter.acquire()
+    assert clock.sleeps == [1.0, 1.0]
+
+def test_rate_limiter_refills_while_idle(clock, limiter):
+    """Test idle time refills the bucket, up to its capacity"""
+    for _ in range(3):
+        limiter.acquire()
+    clock.now += 60
+    for _ in range(3):
+        limiter.acquire()
+    assert clock.sleeps == []
+
+def test_rate_limiter_backoff_and_recovery(clock, limiter):
+    """Test 429s double the spacing up to max_interval and successes halve it"""
+    intervals = []
+    for _ in range(4):
+        limiter.backoff()
+        intervals.append(limiter.min_interval)
+    assert intervals == [1.0, 2.0, 4.0, 4.0]
+    # The burst is drained, so the next call waits for a token
+    limiter.acquire()
+    assert clock.sleeps == [1.0]
+
+    limiter.success()
+    assert limiter.min_interval == 2.0
+    while limiter.min_interval:
+        limiter.success()
+    assert limiter.min_interval == 0.0
+
+@pytest.mark.parametrize("exc, expected", [
+    pytest.param(_HTTPError(429), True, id="requests"),
+    pytest.param(SimpleNamespace(error=_HTTPError(429)), True, id="garth"),
+    pytest.param(SimpleNamespace(exception=SimpleNamespace(status=429)), True, id="parfive"),
+    pytest.param(_HTTPError(500), False, id="server-error"),
+    pytest.param(ValueError("bad"), False, id="other"),
+])
+def test_is_rate_limited(exc, expected):
+    """Test 429s are recognised however the HTTP library wraps them"""
+    assert garmin._is_rate_limited(exc) is expected
+
+def test_with_backoff_retries_429(clock, limiter):
+    """Test a 429 is retried after a growing delay and then succeeds"""
+    fn = Mock(side_effect=[_HTTPError(429), _HTTPError(429), "ok"])
+    assert garmin._with_backoff(fn, retries=3, base=10) == "ok"
+    assert fn.call_count == 3
+    first, second = clock.sleeps
+    assert 10 <= first <= 15 and 20 <= second <= 25
+    assert limiter.min_interval == 2.0
+
+def test_with_backoff_gives_up(clock, limiter):
+    """Test the last 429 and any other error propagate without more retries"""
+    fn = Mock(side_effect=_HTTPError(429))
+    with pytest.raises(_HTTPError):
+        garmin._with_backoff(fn, retries=2, base=1)
+    assert fn.call_count == 2
+
+    fn = Mock(side_effect=ValueError("bad"))
+    with pytest.raises(ValueError):
+        garmin._with_backoff(fn, retries=3, base=1)
+    assert fn.call_count == 1
+
+def test_download_tries_last_good_method_first(limiter):
+    """Test the method that last worked is tried first, the rest in order"""
+    client = garmin.GarminClient()
+    client.client = Mock()
+    formats = []
+
+    def download_activity(activity_id, dl_fmt=None):
+        formats.append(dl_fmt)
+        return b"fit" if dl_fmt == "FIT" else b""
+
+    client.client.download_activity.side_effect = download_activity
+
+    assert client.download_activity_fit(1) == b"fit"
+    assert formats == [None, "FIT"]
+
+    formats.clear()
+    assert client.download_activity_fit(2) == b"fit"
+    assert formats == ["FIT"]
+
+def test_download_order_resets_when_all_methods_fail(limiter):
+    """Test a run where every method fails starts from the first method again"""
+    client = garmin.GarminClient()
+    client.client = Mock()
+    client._last_good_method = 2
+    formats = []
+
+    def download_activity(activity_id, dl_fmt=None):
+        formats.append(dl_fmt)
+        raise ConnectionError("down")
+
+    client.client.download_activity.side_effect = download_activity
+
+    with pytest.raises(RuntimeError):
+        client.download_activity_fit(1)
+    assert formats == ["tcx", None, "FIT"]
+    assert client._last_good_method == 0
@@ -1,110 +1,139 @@
 import pytest
-import sys
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock, call, patch
 
-# Add the project root to the Python path
-sys.path.insert(0, '/app')
 
-from garminsync.database import sync_database, Activity, get_activity_metrics
+def _bulk_batches(executes, attr):
+    """Row lists of each executemany in executes whose statement has attr set
 
-def test_sync_database_with_valid_activities():
-    """Test sync_database with valid API response"""
-    mock_client = Mock()
-    mock_client.get_activities.return_value = [
+    executes is a session.execute call_args_list, captured once per test.
+    """
+    return [
+        c.args[1] for c in executes
+        if len(c.args) > 1 and getattr(c.args[0], attr, False)
+    ]
+
+def _inserted_rows(executes):
+    """Rows of every bulk INSERT ... ON CONFLICT issued by sync_database"""
+    return [row for rows in _bulk_batches(executes, "is_insert") for row in rows]
+
+def _updated_rows(executes):
+    """Rows of every bulk UPDATE issued by sync_database"""
+    return [row for rows in _bulk_batches(executes, "is_update") for row in rows]
+
+def _mock_session(existing_rows):
+    """Session mock whose execute(...).all() returns existing_rows"""
+    # One configure call instead of building the chain attribute by attribute
+    return Mock(**{"execute.return_value.all.return_value": existing_rows})
+
+@pytest.fixture
+def db_mocks(db_module):
+    """Patch the session factory and metrics lookup for one test"""
+    with patch.object(db_module, 'get_session') as get_session, \
+         patch.object(db_module, 'get_activity_metrics') as get_metrics:
+        yield get_session, get_metrics
+
+_RUNNING_METRICS = {
+    "activityType": {"typeKey": "running"},
+    "summaryDTO": {
+        "duration": 3600,
+        "distance": 10.0,
+        "maxHR": 180,
+        "calories": 400
+    }
+}
+_SUMMARY_ONLY_METRICS = {"summaryDTO": {"duration": 3600.0}}
+
+# (activities from the API, existing (activity_id, filename) rows,
+#  metrics, expected upserted ids, expected activity_type of those rows)
+SCENARIOS = [
+    pytest.param([
         {"activityId": 12345, "startTimeLocal": "2023-01-01T10:00:00"},
         {"activityId": 67890, "startTimeLocal": "2023-01-02T11:00:00"}
-    ]
-    
-    mock_session = MagicMock()
-    mock_session.query.return_value.filter_by.return_value.first.return_value = None
-    
-    with patch('garminsync.database.get_session', return_value=mock_session), \
-         patch('garminsync.database.get_activity_metrics', return_value={
-             "activityType": {"typeKey": "running"},
-             "summaryDTO": {
-                 "duration": 3600,
-                 "distance": 10.0,
-                 "maxHR": 180,
-                 "calories": 400
-             }
-         }):
-        
-        sync_database(mock_client)
-        
-        # Verify activities processed
-        assert mock_session.add.call_count == 2
-        assert mock_session.commit.called
-
-def test_sync_database_with_none_activities():
-    """Test sync_database with None response from API"""
-    mock_client = Mock()
-    mock_client.get_activities.return_value = None
-    
-    mock_session = MagicMock()
-    
-    with patch('garminsync.database.get_session', return_value=mock_session):
-        sync_database(mock_client)
-        mock_session.add.assert_not_called()
-
-def test_sync_database_with_missing_fields():
-    """Test sync_database with activities missing required fields"""
-    mock_client = Mock()
-    mock_client.get_activities.return_value = [
+    ], [], _RUNNING_METRICS, [12345, 67890], "running", id="valid"),
+    pytest.param(None, [], _SUMMARY_ONLY_METRICS, [], None, id="none"),
+    pytest.param([
         {"activityId": 12345},
         {"startTimeLocal": "2023-01-02T11:00:00"},
         {"activityId": 67890, "startTimeLocal": "2023-01-03T12:00:00"}
-    ]
-    
-    # Create a mock that returns None for existing activity
-    mock_session = MagicMock()
-    mock_session.query.return_value.filter_by.return_value.first.return_value = None
-    
-    with patch('garminsync.database.get_session', return_value=mock_session), \
-         patch('garminsync.database.get_activity_metrics', return_value={
-             "summaryDTO": {"duration": 3600.0}
-         }):
-        sync_database(mock_client)
-        # Only valid activity should be added
-        assert mock_session.add.call_count == 1
-        added_activity = mock_session.add.call_args[0][0]
-        assert added_activity.activity_id == 67890
-
-def test_sync_database_with_existing_activities():
-    """Test sync_database doesn't duplicate existing activities"""
-    mock_client = Mock()
-    mock_client.get_activities.return_value = [
+    ], [], _SUMMARY_ONLY_METRICS, [67890], None, id="missing-fields"),
+    # Existing rows go through the same UPSERT as new ones; (12345, None) is a
+    # stored activity whose file was never downloaded
+    pytest.param([
         {"activityId": 12345, "startTimeLocal": "2023-01-01T10:00:00"}
-    ]
-    
-    mock_session = MagicMock()
-    mock_session.query.return_value.filter_by.return_value.first.return_value = Mock()
-    
-    with patch('garminsync.database.get_session', return_value=mock_session), \
-         patch('garminsync.database.get_activity_metrics', return_value={
-             "summaryDTO": {"duration": 3600.0}
-         }):
-        sync_database(mock_client)
-        mock_session.add.assert_not_called()
-
-def test_sync_database_with_invalid_activity_data():
-    """Test sync_database with invalid activity data types"""
-    mock_client = Mock()
-    mock_client.get_activities.return_value = [
+    ], [(12345, None)], _SUMMARY_ONLY_METRICS, [12345], None, id="existing"),
+    pytest.param([
         "invalid data",
         None,
         {"activityId": 12345, "startTimeLocal": "2023-01-01T10:00:00"}
+    ], [], _SUMMARY_ONLY_METRICS, [12345], None, id="invalid-data"),
+]
+
+@pytest.mark.parametrize(
+    "activities, existing, metrics, expected_ids, expected_type", SCENARIOS
+)
+def test_sync_database(sync_db, db_mocks, activities, existing, metrics,
+                       expected_ids, expected_type):
+    """Test which activities sync_database upserts for each kind of API response"""
+    garmin_client = Mock()
+    garmin_client.get_activities.return_value = activities
+
+    mock_session = _mock_session(existing_rows=existing)
+
+    get_session, get_metrics = db_mocks
+    get_session.return_value = mock_session
+    get_metrics.return_value = metrics
+
+    sync_db(garmin_client)
+
+    executes = mock_session.execute.call_args_list
+    commits = mock_session.commit.call_args_list
+
+    # Only valid activities are written, all in the bulk UPSERT
+    rows = _inserted_rows(executes)
+    assert [row["activity_id"] for row in rows] == expected_ids
+    assert all(row["activity_type"] == expected_type for row in rows)
+    # No separate UPDATE is issued for existing rows
+    assert _updated_rows(executes) == []
+    # A single page commits once; an empty response never touches the database
+    assert bool(executes) == bool(expected_ids)
+    assert len(commits) == (1 if expected_ids else 0)
+
+def test_sync_database_pages_through_activities(sync_db, db_module, db_mocks):
+    """Test sync_database fetches SYNC_BATCH_SIZE pages until a short page"""
+    garmin_client = Mock()
+    batch = db_module.SYNC_BATCH_SIZE
+
+    def page(start, size):
+        return [
+            {"activityId": start + i + 1, "startTimeLocal": f"2023-01-01T00:00:{i:02d}"}
+            for i in range(size)
+        ]
+
+    garmin_client.get_activities.side_effect = [
+        page(0, batch),
+        page(batch, batch),
+        page(2 * batch, 30),
+    ]
+
+    mock_session = _mock_session(existing_rows=[])
+
+    get_session, get_metrics = db_mocks
+    get_session.return_value = mock_session
+    get_metrics.return_value = _SUMMARY_ONLY_METRICS
+
+    sync_db(garmin_client)
+
+    # The short third page ends the sync without another request
+    assert garmin_client.get_activities.call_args_list == [
+        call(0, batch),
+        call(batch, batch),
+        call(2 * batch, batch),
     ]
-    
-    # Create a mock that returns None for existing activity
-    mock_session = MagicMock()
-    mock_session.query.return_value.filter_by.return_value.first.return_value = None
-    
-    with patch('garminsync.database.get_session', return_value=mock_session), \
-         patch('garminsync.database.get_activity_metrics', return_value={
-             "summaryDTO": {"duration": 3600.0}
-         }):
-        sync_database(mock_client)
-        # Only valid activity should be added
-        assert mock_session.add.call_count == 1
-        added_activity = mock_session.add.call_args[0][0]
-        assert added_activity.activity_id == 12345
+    # One bulk UPSERT and one commit per page
+    executes = mock_session.execute.call_args_list
+    upserts = _bulk_batches(executes, "is_insert")
+    assert [len(rows) for rows in upserts] == [batch, batch, 30]
+    assert [row["activity_id"] for row in _inserted_rows(executes)] == list(
+        range(1, 2 * batch + 31)
+    )
+    assert len(mock_session.commit.call_args_list) == 3